@@ -4,13 +4,18 @@ Author: M.G. Garcia
 """
 
 import os
+import warnings
 import matplotlib
 import numpy as np
 import matplotlib.patches as patches
+from matplotlib.collections import PatchCollection
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from tqdm import tqdm
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image, ImageFile
-from typing import List, Any
+from typing import List, Any, Iterable, Iterator
 from matplotlib.colors import Normalize
 from matplotlib.cm import ScalarMappable
 from visarchpy.models import KmeansBbox20
@@ -19,6 +24,43 @@ from visarchpy.models import KmeansBbox20
 # truncated data (images missing data). Use with caution.
 ImageFile.LOAD_TRUNCATED_IMAGES = True
 
+# Limits for the bounding box plot. They prevent allocating canvases
+# that are too large to be rendered.
+MAX_FIGURE_SIZE = 50  # maximum width or height of the figure in inches
+MAX_FIGURE_PIXELS = 10 ** 8  # maximum number of pixels of the canvas
+MAX_VECTOR_BOXES = 10000  # more boxes than this are drawn as a raster
+
+
+def iter_image_paths(directory: str,
+                     extensions: List[str] = None) -> Iterator[str]:
+    """
+    Yields file paths for all image files in the given directory. The
+    directory is scanned lazily, so paths are produced as they are found.
+
+    Parameters
+    ----------
+
+    directory: str
+        The directory to search for image files.
+    extensions: List[str]
+        List of image extensions to include in the result, e.g. ['.jpg',
+        '.jpeg', '.png', '.bmp', '.gif']. If None, all file extensions
+        (images or not) will be included. Extensions are matched
+        case-insensitively. Default is None.
+
+    Yields
+        File paths of image files in the directory.
+    """
+
+    # str.endswith accepts a tuple and checks all extensions in one call
+    if extensions is not None:
+        extensions = tuple(ext.lower() for ext in extensions)
+
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if extensions is None or entry.name.lower().endswith(extensions):
+                yield entry.path
+
 
 def get_image_paths(directory: str, extensions: List[str] = None) -> List[str]:
     """
@@ -32,28 +74,65 @@ def get_image_paths(directory: str, extensions: List[str] = None) -> List[str]:
     extensions: List[str]
         List of image extensions to include in the result, e.g. ['.jpg',
         '.jpeg', '.png', '.bmp', '.gif']. If None, all file extensions
-        (images or not) will be included. Default is None.
+        (images or not) will be included. Extensions are matched
+        case-insensitively. Default is None.
 
     Returns
         A list of file paths for all image files in the directory.
     """
 
-    # If extensions is None, set it to a list of all image extensions
-    image_extensions = extensions
+    return list(iter_image_paths(directory, extensions))
+
+
+def _read_image_size(image_path: str) -> tuple:
+    """
+    Reads the size (width, height) of an image from its header.
+    The image file is closed right after. Returns a tuple
+    (image_path, size).
+    """
+
+    with Image.open(image_path) as image:
+        return image_path, image.size
+
+
+def _read_image_bbox(image_path: str) -> tuple | None:
+    """
+    Computes the bounding box of the non-zero regions of an image. JPEG
+    images are decoded at a reduced scale (draft mode), which is much faster
+    than a full decode. Their bounding box is scaled back to the original
+    image size and is accurate to a few pixels.
+    Returns None if the image has no non-zero regions.
+    """
+
+    with Image.open(image_path) as image:
+        width, height = image.size
+        if image.format == 'JPEG':
+            # at least 1 pixel per side, Pillow can't draft a size of 0
+            image.draft(image.mode, (max(1, width // 8), max(1, height // 8)))
+        bbox = image.getbbox()
+        if bbox is None:
+            return None
+        scale_x = width / image.width
+        scale_y = height / image.height
 
-    image_paths = []
-    for filename in os.listdir(directory):
+    return (bbox[0] * scale_x, bbox[1] * scale_y,
+            bbox[2] * scale_x, bbox[3] * scale_y)
 
-        if image_extensions is None:
-            image_paths.append(os.path.join(directory, filename))
-        elif extensions is not None:
-            # filter by extension
-            if any(filename.lower().endswith(ext) for ext in image_extensions):
-                image_paths.append(os.path.join(directory, filename))
-    return image_paths
 
+def _filter_images(images: Iterable[tuple],
+                   max_image_size: int) -> Iterator[tuple]:
+    """
+    Yields (path, size) of images with a non-zero size that is not larger
+    than max_image_size (width x height, in pixels).
+    """
 
-def plot_bboxes(images: List[str],
+    for image_path, image_size in images:
+        width, height = image_size
+        if 0 < width * height <= max_image_size:
+            yield image_path, image_size
+
+
+def plot_bboxes(images: Iterable[str],
                 cmap: str = 'cool',
                 predictor: Any = None,
                 show: bool = True,
@@ -61,7 +140,9 @@ def plot_bboxes(images: List[str],
                 resolution: int = 300,
                 scale_factor: float = 1.0,
                 max_image_size: int = 89478485,
-                save_to_file: str = None) -> None:
+                save_to_file: str = None,
+                max_workers: int = None,
+                use_alpha_bbox: bool = False) -> None:
     """
     Creates a plot of the bounding boxes organize concentrically for the given
     images.This type of plot is useful for visualizing the distribution sizes
@@ -69,8 +150,9 @@ def plot_bboxes(images: List[str],
 
     Parameters
     ----------
-    image_paths: List[str]
-        A list of image file paths.
+    images: Iterable[str]
+        Image file paths, e.g. a list or the generator returned by
+        iter_image_paths.
     cmap: str
         Name of the matplotlib color map to be used. Consult the matplotlib
         documentation for valid values.
@@ -82,10 +164,12 @@ def plot_bboxes(images: List[str],
         Shows plot. Default is True.
     size: int
         Size of the figure plot in inches. Default is 10. This value influences
-        the quality of the plot when saving to a file.
+        the quality of the plot when saving to a file. The largest side of
+        the figure is capped to MAX_FIGURE_SIZE inches.
     resolution: int
         Resolution of the plot  and figure in dots per inch (dpi).
-        Default is 300.
+        Default is 300. It is reduced if the plot would have more than
+        MAX_FIGURE_PIXELS pixels.
     scale_factor: float
         Scale factor for the image size. Default is 1.0, which means that
         images will be plotted at their original size. Values larger than
@@ -97,6 +181,15 @@ def plot_bboxes(images: List[str],
         size of an image in pixels that can be stored in a 32-bit system.
     save_to_file: str
         Path to a PNG file to save the plot. If None, no file is saved.
+    max_workers: int
+        Number of threads used to read the image files. If None,
+        min(32, 4 x number of CPUs) is used. Default is None.
+    use_alpha_bbox: bool
+        If True, the bounding box of each image is computed from the
+        non-zero regions of its alpha channel, which requires decoding all
+        pixels. JPEG images are decoded at reduced scale for this.
+        If False, the full image rectangle is used and only the
+        image header is read. Default is False.
 
     Returns
     -------
@@ -105,7 +198,9 @@ def plot_bboxes(images: List[str],
     Raises
     ------
 
-    Warning: If an image has no bounding box in the alpha channel.
+    Warning: If an image has no bounding box in the alpha channel. Only
+             when `use_alpha_bbox` is True.
+    Warning: If the resolution is reduced to limit the size of the plot.
     Warning: Decompression Bomb. If an image is larger than the maximum
              size allowed for a 32-bit system.
     Killed: If system runs out of memory during plotting. Adjusting the
@@ -115,7 +210,14 @@ def plot_bboxes(images: List[str],
 
     # Plot/Figure settings and metadata
     # Create a figure and axis object
-    fig, ax = plt.subplots()
+    if show:
+        fig, ax = plt.subplots()
+    else:
+        # Render off-screen with the Agg backend. This skips the
+        # initialization of interactive backends and works without display
+        fig = Figure()
+        FigureCanvasAgg(fig)
+        ax = fig.subplots()
     fig.set_dpi(resolution)  # set resolution
     # make plot set the axis limits
     ax.plot()
@@ -130,11 +232,20 @@ def plot_bboxes(images: List[str],
     # create color map
     _cmap = matplotlib.colormaps[cmap]
 
-    # list of PIL.Image objects
-    images = [Image.open(image_path) for image_path in images if
-              Image.open(image_path).size != 0 and
-              Image.open(image_path).size[0] *
-              Image.open(image_path).size[1] <= max_image_size]
+    # Header-only pass: sizes are read from the image headers and are
+    # used for the figure size, predictions and for tracking boxes.
+    # Pixels are only accessed (getbbox) for boxes that are drawn.
+    # Reading headers is I/O bound, therefore it is done concurrently
+    # using threads. Images are closed after reading, so no PIL.Image
+    # objects are kept in memory.
+    if max_workers is None:
+        max_workers = min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        image_sizes = executor.map(_read_image_size, images)
+        filtered_images = list(_filter_images(image_sizes, max_image_size))
+
+    image_paths = [image_path for image_path, _ in filtered_images]
+    sizes = [image_size for _, image_size in filtered_images]
 
     if predictor:
         k_predictor = predictor
@@ -142,20 +253,30 @@ def plot_bboxes(images: List[str],
         model = KmeansBbox20()  # loads model
         k_predictor = model()  # gets predictor
 
-    # collect image widths and heights to determine
-    # image  maximum size
-    widths = []
-    heights = []
-    [(widths.append(image.width * scale_factor),
-      heights.append(image.height * scale_factor))
-     for image in images]
+    # image widths and heights as an array of shape (N, 2). It is
+    # used to determine the image maximum size, and for predictions
+    # and rectangle sizes
+    size_array = np.array(sizes, dtype=np.float64).reshape(-1, 2)
+    scaled_sizes = size_array * scale_factor
 
-    max_width = max(widths)
-    max_height = max(heights)
+    max_width, max_height = scaled_sizes.max(axis=0)
     ratio = max_width / max_height
-    # Set the figure to a size while keeping the aspect ratio
-    fig.set_figwidth(size * ratio)
-    fig.set_figheight(size / ratio)
+    # Set the figure to a size while keeping the aspect ratio.
+    # The largest side is capped to MAX_FIGURE_SIZE
+    fig_width = size * ratio
+    fig_height = size / ratio
+    fig_scale = min(1.0, MAX_FIGURE_SIZE / max(fig_width, fig_height))
+    fig.set_figwidth(fig_width * fig_scale)
+    fig.set_figheight(fig_height * fig_scale)
+
+    # reduce resolution if the canvas will have too many pixels
+    max_resolution = (MAX_FIGURE_PIXELS / (fig.get_figwidth() *
+                                           fig.get_figheight())) ** 0.5
+    if resolution > max_resolution:
+        warnings.warn(f'Resolution reduced from {resolution} to \
+{int(max_resolution)} dpi to limit the size of the plot.')
+        resolution = int(max_resolution)
+        fig.set_dpi(resolution)
 
     # Sort the clusters so that labels are organized in increasing order
     # This makes sure that the colors are distributed along the
@@ -164,79 +285,87 @@ def plot_bboxes(images: List[str],
     sorted_label = np.zeros_like(idx)
     sorted_label[idx] = np.arange(idx.shape[0])
 
-    # Collect prediction values and images in preparation for
-    # plotting. This ensures the predict function is called
-    # only once.
-    predictions = []
-    pil_images = []
-    [(predictions.append(k_predictor.predict([[image.width, image.height]])),
-        pil_images.append(image))
-        for image in images]
+    # Predict the labels of all images at once. This ensures the
+    # predict function is called only once.
+    predictions = k_predictor.predict(size_array)
+
+    # trasforms predicted labels to sorted labels
+    sorted_predictions = sorted_label[predictions]
 
     # This is used to strech the colors
     # in the color map using the range of
     # values in the prediction
-    max_sorted_label = max(sorted_label[predictions])
-    min_sorted_label = min(sorted_label[predictions])
+    max_sorted_label = sorted_predictions.max()
+    min_sorted_label = sorted_predictions.min()
+    # avoids division by zero when all images have the same label
+    label_range = max(max_sorted_label - min_sorted_label, 1)
+    # notmalize to 0-1
+    norm_predictions = (sorted_predictions - min_sorted_label) / label_range
 
     box_tracker = {}  # keeps track of size and count of boxes already plotted
-    # plot bounding boxes
-    for prediction, image in tqdm(zip(predictions, pil_images),
-                                  desc='Plotting...', unit='bboxes'):
+    # select images to plot. Boxes with the same size are
+    # drawn on top of each other, therefore only the first one is kept
+    drawn_images = []  # indices of images to plot
+    for index, image_size in enumerate(sizes):
+        if image_size not in box_tracker:
+            box_tracker[image_size] = 1  # initialize box count
+            drawn_images.append(index)
+        else:
+            box_tracker[image_size] = box_tracker.get(image_size) + 1
+
+    # collect bounding boxes
+    bboxes = []
+    kept_images = []
+    for index in tqdm(drawn_images, desc='Plotting...', unit='bboxes'):
         # Get the bounding box for the current image
         # This throws an TypeError if image has an alpha channel by no pixels
         # in that channel. This is the default as of Pillow 10.3.0
         # See: https://pillow.readthedocs.io/en/stable/reference/Image.html
         # #PIL.Image.Image.getbbox
-
-        if image.size not in box_tracker:
-            box_tracker[image.size] = 1  # initialize box count
-
-            bbox = image.getbbox()  # Will return None if alpha channel
-            # is empty
-
-            # trasforms predicted label to sorted label
-            prediction = sorted_label[prediction]
-            # notmalize to 0-1
-            norm_prediction = prediction[0]/(max_sorted_label -
-                                             min_sorted_label)
-            rgba = _cmap(norm_prediction)  # assignes color for rectangle
-
-            if bbox is None:
-                # Skip creating an rectangle image has no bounding
-                # box (read issues with alpha channel above)
-                Warning(f'Image {image.filename} has no bounding box.\
-                        Skipping.')
-                continue
-            else:
-                # Create a rectangle patch for the bounding box
-                # Origin is set to center of drawing aread and
-                # boxes are drawn concentrically.
-                rec_width = image.width * scale_factor
-                rec_height = image.height * scale_factor
-
-                rec_x = bbox[0] * scale_factor
-                rec_y = bbox[1] * scale_factor
-                rect = patches.Rectangle((rec_x - 0.5 * rec_width, rec_y -
-                                          0.5 * rec_height),
-                                         rec_width, rec_height,
-                                         linewidth=1, edgecolor=rgba,
-                                         facecolor='none')
-
-                # Plot the bounding box
-                ax.add_patch(rect)
-            # free some memory. It is convenient with many or large inputs
-            del image
-
+        if use_alpha_bbox:
+            # Will return None if alpha channel is empty
+            bbox = _read_image_bbox(image_paths[index])
         else:
-            box_tracker[image.size] = box_tracker.get(image.size) + 1
+            # full image rectangle. No pixels are decoded
+            bbox = (0, 0) + sizes[index]
+
+        if bbox is None:
+            # Skip creating an rectangle image has no bounding
+            # box (read issues with alpha channel above)
+            warnings.warn(f'Image {image_paths[index]} has no bounding box. '
+                          'Skipping.', stacklevel=2)
+            continue
+
+        bboxes.append(bbox)
+        kept_images.append(index)
+
+    # Create rectangle patches for the bounding boxes
+    # Origin is set to center of drawing aread and
+    # boxes are drawn concentrically.
+    # All coordinates and colors are computed at once
+    rec_sizes = scaled_sizes[kept_images]
+    rec_origins = np.array(bboxes, dtype=np.float64).reshape(-1, 4)[
+        :, :2] * scale_factor - 0.5 * rec_sizes
+
+    # assignes color for rectangles
+    rgba = _cmap(norm_predictions[kept_images])
+
+    rects = [patches.Rectangle(tuple(rec_origin), rec_size[0], rec_size[1])
+             for rec_origin, rec_size in zip(rec_origins, rec_sizes)]
+
+    # Plot all bounding boxes as a single collection, which is drawn
+    # and transformed at once instead of one patch at a time
+    bbox_collection = PatchCollection(rects, linewidths=1,
+                                      edgecolors=rgba, facecolors='none',
+                                      rasterized=len(rects) > MAX_VECTOR_BOXES)
+    ax.add_collection(bbox_collection)
 
     # add plot legend
     # plots colorbar after normalizing the values of he sorted
     # prediction labels
     norm = Normalize(vmin=min_sorted_label, vmax=max_sorted_label)
     scalar_mappable = ScalarMappable(norm=norm, cmap=_cmap)
-    color_bar = plt.colorbar(scalar_mappable, ax=ax)
+    color_bar = fig.colorbar(scalar_mappable, ax=ax)
     color_bar.set_label('Image size (w x h)', fontsize=label_fontsize)
 
     color_bar.ax.tick_params(labelsize=label_fontsize)
@@ -244,11 +373,11 @@ def plot_bboxes(images: List[str],
     min_size_label = str(min(box_tracker.keys()))
     max_size_label = str(max(box_tracker.keys()))
     color_bar.set_ticks(
-        [min_sorted_label[0], max_sorted_label[0]],
+        [min_sorted_label, max_sorted_label],
         labels=[min_size_label, max_size_label])
 
     if save_to_file:
-        plt.savefig(save_to_file, dpi=resolution, bbox_inches='tight')
+        fig.savefig(save_to_file, dpi=resolution, bbox_inches='tight')
         print(f'Plot saved to {save_to_file}')
 
    
@@ -261,7 +390,7 @@ def plot_bboxes(images: List[str],
 if __name__ == "__main__":
 
     # Example of how to use the plot_bboxes function
-    img_plot = get_image_paths(
+    img_plot = iter_image_paths(
         directory='data/plot')
 
     plot_bboxes(img_plot, cmap='gist_heat_r',
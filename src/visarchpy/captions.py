@@ -3,8 +3,11 @@ Extracts captions from PDF pages
 """
 
 import re
+from functools import lru_cache
 from pdfminer.layout import LTTextContainer, LTImage
 from typing import List
+import numpy as np
+import shapely
 from shapely.geometry import Polygon
 from dataclasses import dataclass, field
 from visarchpy.utils import convert_mm_to_point, convert_dpi_to_point
@@ -80,10 +83,11 @@ class BoundingBox:
                      for coord in self.coords)
 
 
-@dataclass
+@dataclass(frozen=True)
 class Offset:
     """
-    represents an offset in the form (distance, unit).
+    represents an offset in the form (distance, unit). Offsets are
+    immutable, so the same offset can be shared by all pages.
     """
 
     distance: float
@@ -122,27 +126,37 @@ def find_caption_by_text(text_element: LTTextContainer,
         if keyword is not a string
     """
 
+    # keywords are validated before the cached call, which needs
+    # hashable arguments
     if len(keywords) == 0:
         raise ValueError("List of keywords cannot be empty. Try adding adding\
                          at least one keyword")
-    else:
-        # constructs regular expression to match
-        # textboxes that start with
-        words = []
-        separator = '|'
-        for word in keywords:
-            if not isinstance(word, str):
-                raise TypeError(f"Keyword must be of type string. {word} has \
-                                 type {type(word)}")
-            words.append('^'+word.lower())
-        regex = separator.join(words)
-
-    if isinstance(text_element, LTTextContainer) and re.search(regex, text_element.get_text().lower()):
+    for word in keywords:
+        if not isinstance(word, str):
+            raise TypeError(f"Keyword must be of type string. {word} has \
+                             type {type(word)}")
+
+    regex = _caption_regex(tuple(keywords))
+
+    if isinstance(text_element, LTTextContainer) and regex.search(text_element.get_text().lower()):
         return text_element
     else:
         return False
 
 
+@lru_cache(maxsize=None)
+def _caption_regex(keywords: tuple) -> re.Pattern:
+    """Compiles a regular expression that matches text starting with any
+    of the keywords. Results are cached, so a regular expression is
+    compiled once per set of keywords."""
+
+    # constructs regular expression to match
+    # textboxes that start with
+    regex = '|'.join('^' + word.lower() for word in keywords)
+
+    return re.compile(regex)
+
+
 def find_caption_by_distance(image_object: LTImage | BoundingBox,
                              text_object: LTTextContainer | BoundingBox,
                              offset: Offset, direction: str = None
@@ -190,9 +204,286 @@ def find_caption_by_distance(image_object: LTImage | BoundingBox,
         image bounding box.
     """
 
-    image_coords = image_object.bbox
+    search_area = _caption_search_area(image_object, offset, direction)
+
+    if search_area.intersects(_text_area(text_object)):
+        return text_object
+    else:
+        return False
+
+
+def find_captions_by_distance(image_objects: List[LTImage | BoundingBox],
+                              text_objects: List[LTTextContainer |
+                                                 BoundingBox],
+                              offset: Offset, direction: str = None
+                              ) -> List[List[LTTextContainer | BoundingBox]]:
+    """
+    Finds text elements within a certain distance (offset) from the
+    bounding box of each image in a list. It gives the same results as
+    calling find_caption_by_distance() for every pair of image and text
+    elements, but all pairs are compared at once using arrays of
+    coordinates.
+
+    Parameters
+    ----------
+    image_objects: list
+        LTImage or BoundingBox objects whose bounding boxes will be used as
+        reference.
+    text_objects: list
+        LTTextContainer or BoundingBox objects whose bounding boxes will be
+        compared with the image bounding boxes.
+    offset: OffsetDistance object
+        distance from image within which text elements will be searched.
+    direction: str
+        the directions the offeset will be applied around the image bounding
+        box. See find_caption_by_distance().
+
+    Returns
+    -------
+    list
+        A list with one element per image. Each element is the list of text
+        elements within offset distance of the image, in the order of
+        text_objects.
+
+    Raises
+    ------
+    ValueError
+        if direction is not valid. See find_caption_by_distance().
+    """
+
+    if len(image_objects) == 0:
+        return []
+
+    image_coords, pixels = zip(*(_image_coords(image_object)
+                                 for image_object in image_objects))
+    image_coords = np.array(image_coords, dtype=float)
+    pixels = np.array(pixels)
+    text_coords = np.array([_text_coords(text_object)
+                            for text_object in text_objects],
+                           dtype=float).reshape(-1, 4)
+
+    search_areas = np.empty(len(image_objects), dtype=object)
+    for in_pixels in (False, True):  # images in pixels have another origin
+        if np.any(pixels == in_pixels):
+            search_areas[pixels == in_pixels] = _caption_search_areas(
+                image_coords[pixels == in_pixels], offset, direction,
+                pixels=in_pixels)
+
+    return [[text_objects[text_index] for text_index in text_indices]
+            for text_indices in _match_search_areas(search_areas,
+                                                    text_coords)]
+
+
+def find_caption_indices_by_distance(image_bboxes: np.ndarray,
+                                     text_bboxes: np.ndarray,
+                                     offset: Offset, direction: str = None,
+                                     pixels: bool = False
+                                     ) -> List[List[int]]:
+    """
+    Finds text bounding boxes within a certain distance (offset) from each
+    image bounding box. Works like find_captions_by_distance(), but
+    bounding boxes are given as arrays of coordinates, so no objects have
+    to be created for each bounding box.
+
+    Parameters
+    ----------
+    image_bboxes: np.ndarray
+        (N, 4) array with the (x0, y0, x1, y1) coordinates of images.
+    text_bboxes: np.ndarray
+        (M, 4) array with the (x0, y0, x1, y1) coordinates of text
+        elements.
+    offset: OffsetDistance object
+        distance from image within which text elements will be searched.
+    direction: str
+        the directions the offeset will be applied around the image bounding
+        box. See find_caption_by_distance().
+    pixels: bool
+        if True, coordinates are in pixels with the origin on the top-left
+        corner, as given by OCR. Otherwise, coordinates are in points with
+        the origin on the bottom-left corner, as given by layout analysis.
+
+    Returns
+    -------
+    list
+        A list with one element per image. Each element is the list of
+        indices of text bounding boxes within offset distance of the image,
+        in ascending order.
+
+    Raises
+    ------
+    ValueError
+        if direction is not valid. See find_caption_by_distance().
+    """
+
+    image_bboxes = np.asarray(image_bboxes, dtype=float).reshape(-1, 4)
+    if len(image_bboxes) == 0:
+        return []
+
+    search_areas = _caption_search_areas(image_bboxes, offset, direction,
+                                         pixels=pixels)
+
+    return _match_search_areas(search_areas, np.asarray(
+        text_bboxes, dtype=float).reshape(-1, 4))
+
+
+def _match_search_areas(search_areas: np.ndarray,
+                        text_coords: np.ndarray) -> List[List[int]]:
+    """Returns the indices of the text boxes that intersect each search
+    area, in ascending order."""
+
+    if len(search_areas) == 0 or len(text_coords) == 0:
+        return [[] for _ in search_areas]
+
+    # search areas are rectangles, or rectangles with a rectangular hole
+    # (direction 'all'), so intersections are found by comparing bounds of
+    # every pair of image and text box at once, instead of the polygons.
+    # Boundaries are included, as for Polygon.intersects()
+    outer = shapely.bounds(search_areas)[:, np.newaxis, :]
+    hole = shapely.bounds(
+        shapely.get_interior_ring(search_areas, 0))[:, np.newaxis, :]
+    text = text_coords[np.newaxis, :, :]
+
+    overlaps = ((outer[..., 0] <= text[..., 2]) &
+                (text[..., 0] <= outer[..., 2]) &
+                (outer[..., 1] <= text[..., 3]) &
+                (text[..., 1] <= outer[..., 3]))
+    # text boxes strictly inside the hole don't touch the search area.
+    # Comparisons with NaN bounds (no hole) are always False
+    in_hole = ((hole[..., 0] < text[..., 0]) &
+               (text[..., 2] < hole[..., 2]) &
+               (hole[..., 1] < text[..., 1]) &
+               (text[..., 3] < hole[..., 3]))
+
+    return [np.flatnonzero(row).tolist() for row in overlaps & ~in_hole]
+
+
+def _image_coords(image_object: LTImage | BoundingBox) -> tuple:
+    """Returns the coordinates of the bounding box of an image in the units
+    used for caption search, and whether they are in pixels."""
+
+    if isinstance(image_object, BoundingBox):
+
+        if image_object.unit in ["mm", "pt"]:
+            return image_object.bbox(), False
+        elif isinstance(image_object.unit, int):
+            return image_object.bbox_px(), True
+
+        else:
+            raise TypeError("combination of units not supported")
+
+    return image_object.bbox, False
+
+
+def _caption_search_areas(image_bboxes: np.ndarray, offset: Offset,
+                          direction: str = None, pixels: bool = False
+                          ) -> np.ndarray:
+    """Returns the areas around images where captions are searched, for an
+    (N, 4) array of image coordinates. The areas are the same as those of
+    _caption_search_area(), but all polygons are created at once."""
+
+    if offset.unit == "mm":  # Bbox from pdfminer are in points
+        offset_distance = convert_mm_to_point(offset.distance)
+
+    if direction not in ["right", "left", "down", "up", "right-down",
+                         "left-up", "all", None]:
+        raise ValueError("direction must be either right, left, down, up, \
+                         right-down, left-up, all")
+
+    if offset.unit == "px":
+        offset_distance = offset.distance
+
+    if pixels:
+        # Inverting the directions is necessary for OCR because
+        # the origin of the coordinate is on the top-left corner of
+        # the image. See _caption_search_area()
+        direction = {"down": "up", "up": "down"}.get(direction, direction)
+
+    x0, y0, x1, y1 = image_bboxes.T
+    width = np.abs(x1 - x0)
+    height = np.abs(y1 - y0)
+
+    # same vertices as the polygons in _caption_search_area()
+    if direction == "up":
+        shells = [(x0, y0 + height), (x1, y0 + height),
+                  (x1, y1 + offset_distance), (x0, y1 + offset_distance),
+                  (x0, y0 + height)]
+    elif direction == "down":
+        shells = [(x0, y0), (x1, y1 - height),
+                  (x1, y1 - height - offset_distance),
+                  (x0, y0 - offset_distance), (x0, y0)]
+    elif direction == "right":
+        shells = [(x0 + width, y0), (x1 + width + offset_distance, y0),
+                  (x1 + width + offset_distance, y1), (x0 + width, y1),
+                  (x0 + width, y0)]
+    elif direction == "left":
+        shells = [(x0 - offset_distance, y0), (x1 - width, y0),
+                  (x1 - width, y1), (x0 - offset_distance, y1),
+                  (x0 - offset_distance, y0)]
+    elif direction is None or direction == "all":
+        shells = [(x0 - offset_distance, y0 - offset_distance),
+                  (x1 + offset_distance, y0 - offset_distance),
+                  (x1 + offset_distance, y1 + offset_distance),
+                  (x0 - offset_distance, y1 + offset_distance),
+                  (x0 - offset_distance, y0 - offset_distance)]
+        holes = [(x0, y0), (x1, y0), (x1, y1), (x0, y1), (x0, y0)]
+        return shapely.polygons(_rings(shells),
+                                holes=_rings(holes)[:, np.newaxis])
+    else:
+        raise ValueError("direction " + direction + " is not supported "
+                         "for caption search")
+
+    return shapely.polygons(_rings(shells))
+
+
+def _rings(vertices: list) -> np.ndarray:
+    """Stacks a list of (x, y) vertices, where x and y are arrays of
+    coordinates, into an (N, vertices, 2) array of rings."""
+
+    return np.stack([np.stack(np.broadcast_arrays(x, y), axis=-1)
+                     for x, y in vertices], axis=1)
+
+
+def _text_area(text_object: LTTextContainer | BoundingBox) -> Polygon:
+    """Returns the bounding box of a text element as a polygon."""
+
+    text_coords = _text_coords(text_object)
+
+    return Polygon([
+                    (text_coords[0], text_coords[1]),
+                    (text_coords[2], text_coords[1]),
+                    (text_coords[2], text_coords[3]),
+                    (text_coords[0], text_coords[3]),
+                    (text_coords[0], text_coords[1])
+                    ])
+
+
+def _text_coords(text_object: LTTextContainer | BoundingBox) -> tuple:
+    """Returns the coordinates of the bounding box of a text element in
+    the units used for caption search."""
+
     text_coords = text_object.bbox
 
+    if isinstance(text_object, BoundingBox):
+
+        if text_object.unit in ["mm", "pt"]:
+            text_coords = text_object.bbox()
+        elif isinstance(text_object.unit, int):
+            text_coords = text_object.bbox_px()
+
+        else:
+            raise TypeError("combination of units not supported")
+
+    return text_coords
+
+
+def _caption_search_area(image_object: LTImage | BoundingBox,
+                         offset: Offset, direction: str = None
+                         ) -> Polygon:
+    """Returns the area around an image where captions are searched. See
+    find_caption_by_distance() for a description of the parameters."""
+
+    image_coords = image_object.bbox
+
     if offset.unit == "mm":  # Bbox from pdfminer are in points
         offset_distance = convert_mm_to_point(offset.distance)
 
@@ -226,16 +517,6 @@ def find_caption_by_distance(image_object: LTImage | BoundingBox,
         else:
             raise TypeError("combination of units not supported")
 
-    if isinstance(text_object, BoundingBox):
-
-        if text_object.unit in ["mm", "pt"]:
-            text_coords = text_object.bbox()
-        elif isinstance(text_object.unit, int):
-            text_coords = text_object.bbox_px()
-
-        else:
-            raise TypeError("combination of units not supported")
-
     width = abs(image_coords[2] - image_coords[0])
     height = abs(image_coords[3] - image_coords[1])
 
@@ -427,18 +708,7 @@ def find_caption_by_distance(image_object: LTImage | BoundingBox,
                              image_coords[1]),
         ))
 
-    text_bbox = Polygon([
-                            (text_coords[0], text_coords[1]),
-                            (text_coords[2], text_coords[1]),
-                            (text_coords[2], text_coords[3]),
-                            (text_coords[0], text_coords[3]),
-                            (text_coords[0], text_coords[1])
-                    ])
-
-    if search_area.intersects(text_bbox):
-        return text_object
-    else:
-        return False
+    return search_area
 
 
 if __name__ == '__main__':
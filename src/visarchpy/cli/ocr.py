@@ -21,7 +21,8 @@ def from_file(
     pdf_file: str = typer.Argument(help="Path to directory containing PDF files."),
     output_directory: str = typer.Argument(help="Path to directory where results will be saved."),
     settings: Annotated[str, typer.Option(help="Path to pipeline JSON setting file. If None default settings are used. Use: [COMMAND] settings, to see current settings.")] = None,
-    mods: Annotated[str, typer.Option(help="Path to MODS file. If None, metadata extraction will be skiped.")] = None
+    mods: Annotated[str, typer.Option(help="Path to MODS file. If None, metadata extraction will be skiped.")] = None,
+    max_workers: Annotated[int, typer.Option(help="Maximum number of processes used to analyse PDF files. If None, PDF files are analysed sequentially.")] = None
     ) -> None:
 
     if settings is None:
@@ -41,7 +42,7 @@ def from_file(
 
     pipeline = OCR(data_directory, output_directory,
                              settings=settings, metadata_file=mods,
-                             ignore_id=True)
+                             ignore_id=True, max_workers=max_workers)
 
     pipeline.run()
 
@@ -57,7 +58,9 @@ def from_dir(
     settings: Annotated[str, typer.Option(help="Path to pipeline JSON setting file. If None default settings are used. Use: [COMMAND] settings, to see current settings.")] = None,
     mods: Annotated[str, typer.Option(help="Path to MODS file. If None, metadata extraction will be skiped.")] = None,
     tmp: Annotated[str, typer.Option(help="If provided, PDF files in the data directory will be copied to this directory.")
-    ] = None) -> None:
+    ] = None,
+    max_workers: Annotated[int, typer.Option(help="Maximum number of processes used to analyse PDF files. If None, PDF files are analysed sequentially.")] = None
+    ) -> None:
     
     if settings is None:
         settings = default_settings.init()
@@ -68,7 +71,8 @@ def from_dir(
 
     pipeline = OCR(data_directory, output_directory,
                              settings=settings, metadata_file=mods,
-                             temp_directory=tmp, ignore_id=True)
+                             temp_directory=tmp, ignore_id=True,
+                             max_workers=max_workers)
 
     pipeline.run()
 
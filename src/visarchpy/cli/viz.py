@@ -4,7 +4,7 @@ import os
 import typer
 from tqdm import tqdm
 from typing_extensions import Annotated
-from visarchpy.analytics import plot_bboxes, get_image_paths
+from visarchpy.analytics import plot_bboxes, iter_image_paths
 
 app = typer.Typer(help="Utility for visualizing architectural visuals.",
     context_settings={"help_option_names": ["-h", "--help"]},
@@ -22,7 +22,7 @@ def bbox_plot(
     ) -> None:
         
     # get image from image_dir
-    images = get_image_paths(image_dir)
+    images = iter_image_paths(image_dir)
 
     # create plot
     plot_bboxes(images, cmap=color_map, show=show, size=size, resolution=resolution, save_to_file=output_file, max_image_size=max_image_size)
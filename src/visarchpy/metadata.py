@@ -4,11 +4,15 @@ Author: M.G. Garcia
 """
 
 import os
+import copy
+import csv
 import uuid
 import pandas as pd
 import json
+import textwrap
 import warnings
 from dataclasses import dataclass, field, asdict
+from functools import lru_cache
 from typing import Optional, List
 from pymods import MODSReader
 
@@ -396,6 +400,36 @@ class Metadata:
         # update total number of visuals
         self.total_visuals += 1
 
+    def merge(self, metadata: 'Metadata') -> None:
+        """ Adds the documents and visuals of another metadata object.
+        This is used to combine results of PDF files processed
+        independently.
+
+        Parameters
+        ----------
+        metadata: Metadata
+            metadata object whose documents and visuals will be added
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        TypeError
+            if metadata is not a Metadata object
+
+        """
+
+        if not isinstance(metadata, Metadata):
+            raise TypeError('metadata must be a Metadata object')
+
+        for document in metadata.documents or []:
+            self.add_document(document)
+
+        for visual in metadata.visuals or []:
+            self.add_visual(visual)
+
     def as_dict(self) -> dict:
         """ Returns metadata as a dictionary """
         return asdict(self)
@@ -418,10 +452,19 @@ class Metadata:
 
         """
 
-        self.as_dataframe().to_csv(filename, index=False)
+        row = self.as_dict()
+        # a single row is written with the csv module, which gives the same
+        # output as DataFrame.to_csv() without creating a DataFrame
+        with open(filename, 'w', newline='') as f:
+            writer = csv.writer(f, lineterminator=os.linesep)
+            writer.writerow(row.keys())
+            writer.writerow(row.values())
 
     def save_to_json(self, filename: str) -> None:
-        """ Writes metadata to a JSON file 
+        """ Writes metadata to a JSON file. Visuals are written one at a
+        time, so the metadata is never converted to a dictionary as a
+        whole. The file is first written to a temporary file and then
+        renamed, so an interrupted run doesn't leave a truncated file.
 
         Parameters
         ----------
@@ -433,12 +476,41 @@ class Metadata:
         None
         """
 
-        with open(filename, 'w') as f:
-            json.dump(self.as_dict(), f, indent=4)
+        entry = copy.copy(self)  # visuals are written separately
+        entry.visuals = None
+        fields = asdict(entry)
+        fields.pop('visuals')
+
+        temp_file = filename + '.tmp'
+        with open(temp_file, 'w') as f:
+            # same indentation as json.dump() of the whole metadata. Values
+            # are dumped one by one, and visuals are written last
+            f.write('{\n')
+            for name, value in fields.items():
+                f.write(f'    {json.dumps(name)}: ')
+                f.write(json.dumps(value, indent=4).replace('\n', '\n    '))
+                f.write(',\n')
+            f.write('    "visuals": ')
+            if self.visuals is None:
+                f.write('null')
+            elif len(self.visuals) == 0:
+                f.write('[]')
+            else:
+                f.write('[\n')
+                for index, visual in enumerate(self.visuals):
+                    if index > 0:
+                        f.write(',\n')
+                    f.write(textwrap.indent(
+                        json.dumps(asdict(visual), indent=4), ' ' * 8))
+                f.write('\n    ]')
+            f.write('\n}')
+        os.replace(temp_file, filename)
 
 
 def extract_mods_metadata(mods_file: str) -> dict:
-    """ Extract metadata from MODS files, version 3.6
+    """ Extract metadata from MODS files, version 3.6. Parsed files are
+    cached by path and modification time, so a MODS file is parsed only
+    once per process unless it changes.
 
     Parameters
     ----------
@@ -451,6 +523,27 @@ def extract_mods_metadata(mods_file: str) -> dict:
         Dictionary with MODS elements and values
     """
 
+    meta = _cached_mods_metadata(mods_file, os.path.getmtime(mods_file))
+
+    # a copy is returned, so that callers can't modify the cached metadata
+    return copy.deepcopy(meta)
+
+
+@lru_cache(maxsize=1024)
+def _cached_mods_metadata(mods_file: str, mtime: float) -> dict:
+    """
+    Parses a MODS file. Results are cached by file path and modification
+    time.
+    """
+
+    return _read_mods_metadata(mods_file)
+
+
+def _read_mods_metadata(mods_file: str) -> dict:
+    """
+    Parses a MODS file. See extract_mods_metadata().
+    """
+
     mods = MODSReader(mods_file)
 
     meta = {}
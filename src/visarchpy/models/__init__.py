@@ -2,7 +2,23 @@
 Loads pretrained models for its use in the VisArchPy package.
 """
 
+import os
 import pickle
+from functools import lru_cache
+from typing import Any
+
+MODELS_DIR = os.path.dirname(os.path.realpath(__file__))
+
+
+@lru_cache(maxsize=None)
+def _load_model(model_file: str, mtime: float) -> Any:
+    """
+    Loads a pickled model. Results are cached by file path and
+    modification time, so the file is read only once unless it changes.
+    """
+
+    with open(model_file, 'rb') as f:
+        return pickle.load(f)
 
 
 class KmeansBbox20:
@@ -12,8 +28,8 @@ class KmeansBbox20:
 
     def __init__(self):
 
-        with open('./src/visarchpy/models/kmeans_bbox20.pkl', 'rb') as f:
-            predictor = pickle.load(f)
+        model_file = os.path.join(MODELS_DIR, 'kmeans_bbox20.pkl')
+        predictor = _load_model(model_file, os.path.getmtime(model_file))
 
         self.predictor = predictor
 
@@ -4,14 +4,25 @@ to PDF files.
 Author: Manuel Garcia
 """
 
-import itertools
+import os
+import tempfile
 import pytesseract
 import copy
+import PIL.Image
+import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
 from bs4 import BeautifulSoup
 from visarchpy.pdf import convert_pdf_to_image
 from PIL.Image import Image
+import shapely
+from shapely import STRtree
+
+# Minimum number of boxes for which filter_bbox_contained() uses a
+# spatial index. Comparing all pairs of boxes at once with NumPy is
+# faster for fewer boxes, but its memory grows with the square of the
+# number of boxes
+CONTAINED_INDEX_MIN_BOXES = 500
 
 
 def region_to_string(image: Image,
@@ -72,13 +83,15 @@ def extract_bboxes_from_horc(images: list[Image],
     Returns
     -------
     dict
-        Dictionary with bounding boxes and ids for non-text regions. If
+        Dictionary with bounding boxes and ids for non-text regions, and
+        bounding boxes and recognized text for text regions. If
         nothing is detected by the OCR, it returns an empty dictionary.
         Example:
 
         {'pageId': {'img': pageImage,
                     'bboxes': {'id1': [bbox], ... 'idn': [bbox] },
-                    'text_bboxes': {'id1': [bbox], ... 'idn': [bbox] }
+                    'text_bboxes': {'id1': [bbox], ... 'idn': [bbox] },
+                    'texts': {'id1': 'text', ... 'idn': 'text' }
         } }
 
     Raises:
@@ -113,23 +126,16 @@ def extract_bboxes_from_horc(images: list[Image],
         paragraphs = soup.find_all('p', class_='ocr_par')
         non_text_bboxes = {}
         text_bboxes = {}
+        texts = {}
 
         for paragraph in paragraphs:
-            title = paragraph.get('title')
-            id = paragraph.get('id')
-            # use to check if paragraph contains text
-            text_element = paragraph.find('span', {'class': 'ocrx_word'})
-            text = text_element.get_text()
-
-            if title and text.strip() == "":
-                bounding_box = title.split(';')[0].split(' ')[1:]
-                bounding_box = [int(value) for value in bounding_box]
+            id, bounding_box, text = _parse_hocr_paragraph(paragraph)
 
-                non_text_bboxes[str(id)] = bounding_box
+            if text is None:
+                non_text_bboxes[id] = bounding_box
             else:
-                bounding_box = title.split(';')[0].split(' ')[1:]
-                bounding_box = [int(value) for value in bounding_box]
-                text_bboxes[str(id)] = bounding_box
+                text_bboxes[id] = bounding_box
+                texts[id] = text
 
             if page_counter is not None:
                 _page_number = page_counter
@@ -141,13 +147,15 @@ def extract_bboxes_from_horc(images: list[Image],
                 hocr_results[f'{entry_id}-page-{_page_number}'] = {
                     'img': img,
                     'bboxes': non_text_bboxes,
-                    'text_bboxes': text_bboxes
+                    'text_bboxes': text_bboxes,
+                    'texts': texts
                 }
             else:
                 hocr_results[f'page-{_page_number}'] = {
                     'img': img,
                     'bboxes': non_text_bboxes,
-                    'text_bboxes': text_bboxes
+                    'text_bboxes': text_bboxes,
+                    'texts': texts
                 }
     # hocr results may be empty if no parragraphs are recognized
     # during the OCR analysis.
@@ -155,6 +163,157 @@ def extract_bboxes_from_horc(images: list[Image],
     return hocr_results
 
 
+def extract_bboxes_from_horc_pages(images: list[Image],
+                                   page_numbers: list[int],
+                                   config: str = '--oem 3 --psm 1',
+                                   entry_id: str = None,
+                                   resize: int = 32767) -> dict:
+    """
+    Extract bounding boxes for elements from the hOCR document of several
+    pages with a single call to Tesseract. Pages are saved as one
+    multi-page TIFF file, so Tesseract is started and its models are
+    loaded once for all pages. Results are the same as calling
+    extract_bboxes_from_horc() on each page.
+
+    Parameters
+    -----------
+    images: list[Image]
+        list of images of type Pillow Image, one per page
+    page_numbers: list[int]
+        page numbers for the PDF file, one per image
+    config: str
+        tesseract configuration options. See extract_bboxes_from_horc().
+    entry_id:
+        id for entry (an entry identifies a group of files somehow related).
+        Optional.
+    resize: int
+        maximun width or height allowed before resizing is enforced. See
+        extract_bboxes_from_horc().
+
+    Returns
+    -------
+    dict
+        Dictionary with the results of each page, in the same format as
+        extract_bboxes_from_horc(). Pages where nothing is detected by the
+        OCR are not included.
+
+    Raises:
+    -------
+        ValueError, if resize is larger than 32767 pixels, the limit
+        in Tesseract 5.3, or if there isn't one page number per image.
+    """
+    _config = config + ' hocr'
+
+    if resize > 32767:
+        raise ValueError('resize must be less than 32768 pixels, the\
+                         limit in Tesseract 5.3')
+    if len(images) != len(page_numbers):
+        raise ValueError('images and page_numbers must have the same length')
+
+    if len(images) == 0:
+        return {}
+
+    for img in images:
+        # resize image if it is too large
+        if img.width > resize or img.height > resize:
+            img.thumbnail((resize, resize))
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # pages are saved without compression or resolution, as single
+        # images are sent to Tesseract by pytesseract
+        tiff_file = os.path.join(temp_dir, 'pages.tif')
+        pages = [_without_alpha(img) for img in images]
+        pages[0].save(tiff_file, format='TIFF', save_all=True,
+                      append_images=pages[1:])
+        horc_data = pytesseract.image_to_pdf_or_hocr(tiff_file,
+                                                     extension='hocr',
+                                                     config=_config)
+    soup = BeautifulSoup(horc_data, 'html.parser')
+
+    hocr_results = {}
+    for page in soup.find_all('div', class_='ocr_page'):
+        # pages are numbered from 1 in the order of the images
+        page_index = int(page.get('id').split('_')[1]) - 1
+        paragraphs = page.find_all('p', class_='ocr_par')
+        if len(paragraphs) == 0:  # as in extract_bboxes_from_horc()
+            continue
+        non_text_bboxes = {}
+        text_bboxes = {}
+        texts = {}
+
+        for paragraph in paragraphs:
+            id, bounding_box, text = _parse_hocr_paragraph(paragraph)
+            id = _single_page_id(id)
+
+            if text is None:
+                non_text_bboxes[id] = bounding_box
+            else:
+                text_bboxes[id] = bounding_box
+                texts[id] = text
+
+        page_number = page_numbers[page_index]
+        if entry_id is not None:
+            page_id = f'{entry_id}-page-{page_number}'
+        else:
+            page_id = f'page-{page_number}'
+        hocr_results[page_id] = {
+            'img': images[page_index],
+            'bboxes': non_text_bboxes,
+            'text_bboxes': text_bboxes,
+            'texts': texts
+        }
+
+    return hocr_results
+
+
+def _parse_hocr_paragraph(paragraph) -> tuple:
+    """Returns the id, the bounding box and the text of a paragraph in
+    an hOCR document. The text is None for non-text regions."""
+
+    title = paragraph.get('title')
+    id = paragraph.get('id')
+    # use to check if paragraph contains text
+    text_element = paragraph.find('span', {'class': 'ocrx_word'})
+    text = text_element.get_text()
+
+    bounding_box = title.split(';')[0].split(' ')[1:]
+    bounding_box = [int(value) for value in bounding_box]
+
+    if title and text.strip() == "":
+        return str(id), bounding_box, None
+
+    # words of the paragraph, in reading order
+    return str(id), bounding_box, ' '.join(
+        word.get_text() for word in
+        paragraph.find_all('span', {'class': 'ocrx_word'}))
+
+
+def _single_page_id(id: str) -> str:
+    """Tesseract numbers the elements of a multi-page image as
+    <element>_<page>_<number>. Returns the id the element has when its
+    page is processed alone, so ids don't depend on how pages are
+    grouped."""
+
+    parts = id.split('_')
+    if len(parts) == 3:
+        parts[1] = '1'
+
+    return '_'.join(parts)
+
+
+def _without_alpha(image: Image) -> Image:
+    """Replaces the alpha channel of an image with a white background, as
+    pytesseract does before sending an image to Tesseract."""
+
+    if 'A' not in image.getbands():
+        return image
+
+    background = PIL.Image.new('RGB', image.size, (255, 255, 255))
+    background.paste(image, (0, 0), image.getchannel('A'))
+
+    return background
+
+
 def crop_images_to_bbox(hocr_results: dict, output_dir: str,
                         filter_size: int = 50) -> None:
     """
@@ -292,7 +451,8 @@ def mark_bounding_boxes(hocr_results: dict,
 
 def filter_bbox_by_size(bboxes: dict, min_width: int = None,
                         min_height: int = None,
-                        aspect_ratio: tuple[float, str] = [None, None]
+                        aspect_ratio: tuple[float, str] | list[tuple] = [
+                            None, None]
                         ) -> dict:
     """
     Filters bounding boxes based on size and aspect ratio of width and height.
@@ -315,7 +475,9 @@ def filter_bbox_by_size(bboxes: dict, min_width: int = None,
         indicating if filter excludes boxes smaller than or larger than the
         aspect ratio. For example, (1.5, '>') will filter out boxes with
         aspect ratio larger than (>) 1.5, and (1.5, '<') will filter out
-        boxes with aspect ratio smaller than (<) 1.5. Optional.
+        boxes with aspect ratio smaller than (<) 1.5. A list of tuples
+        applies several aspect ratios at once, e.g. [(20, '>'), (0.05, '<')].
+        Optional.
 
     Returns
     -------
@@ -326,36 +488,55 @@ def filter_bbox_by_size(bboxes: dict, min_width: int = None,
     if min_width is None and min_height is None and aspect_ratio is None:
         raise ValueError('At least one filtering parameter must be provided')
 
+    # one or several aspect ratios
+    if aspect_ratio is None or len(aspect_ratio) == 0 or (
+            aspect_ratio[0] is None):
+        aspect_ratios = []
+    elif isinstance(aspect_ratio[0], (tuple, list)):
+        aspect_ratios = list(aspect_ratio)
+    else:
+        aspect_ratios = [aspect_ratio]
+
     # type checking
-    if isinstance(aspect_ratio, tuple):
-        # aspect = aspect_ratio[0]
-        operator = aspect_ratio[1]
+    for _, operator in aspect_ratios:
         if operator not in ['<', '>']:
             raise ValueError('Operator must be either "<" or ">"')
 
     if len(bboxes) == 0:
         return bboxes
 
-    filtered_bboxes = {}
-    for id in bboxes.keys():
-        x1, y1, x2, y2 = bboxes[id]
-        width = x2 - x1
-        height = y2 - y1
-        if min_width is not None and width < min_width:
-            continue
-        if min_height is not None and height < min_height:
-            continue
-        if aspect_ratio[0] is not None:
-            if aspect_ratio[1] == '<':
-                if width/height < aspect_ratio[0]:
-                    continue
-            elif aspect_ratio[1] == '>':
-                if width/height > aspect_ratio[0]:
-                    continue
-        # overwrite bboxes with filtered bboxes
-        filtered_bboxes[id] = bboxes[id]
+    # all boxes are filtered at once as an (N, 4) array
+    ids = list(bboxes)
+    coords = np.array([bboxes[id] for id in ids], dtype=float)
+    keep = _size_mask(coords, min_width, min_height, aspect_ratios)
+
+    return {id: bboxes[id] for id, kept in zip(ids, keep) if kept}
+
+
+def _size_mask(coords: np.ndarray, min_width: int = None,
+               min_height: int = None, aspect_ratios: list = None
+               ) -> np.ndarray:
+    """Returns which boxes in an (N, 4) array of coordinates pass the size
+    and aspect ratio filters. See filter_bbox_by_size()."""
 
-    return filtered_bboxes
+    width = coords[:, 2] - coords[:, 0]
+    height = coords[:, 3] - coords[:, 1]
+
+    keep = np.ones(len(coords), dtype=bool)
+    if min_width is not None:
+        keep &= width >= min_width
+    if min_height is not None:
+        keep &= height >= min_height
+    if aspect_ratios:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = width / height
+    for value, operator in aspect_ratios or []:
+        if operator == '<':
+            keep &= ~(ratio < value)
+        elif operator == '>':
+            keep &= ~(ratio > value)
+
+    return keep
 
 
 def filter_bbox_largest(bboxes: dict) -> dict:
@@ -412,54 +593,142 @@ def filter_bbox_contained(bboxes: dict) -> dict:
     if len(bboxes) == 0 or len(bboxes) == 1:
         return bboxes
 
-    def is_contained(bbox1, bbox2):
-        "Check if bbox1 is contained in bbox2"
-        x1, y1, x2, y2 = bbox1
-        x1_, y1_, x2_, y2_ = bbox2
-        if x1_ <= x1 and y1_ <= y1 and x2_ >= x2 and y2_ >= y2:
-            return True
-        else:
-            return False
-
     # remove element in input bboxes that contain the same coordinates
     unique_bboxes = {}
+    seen_bboxes = set()
     for id, box in bboxes.items():
-        if box in unique_bboxes.values():
+        if tuple(box) in seen_bboxes:
             continue
         else:
+            seen_bboxes.add(tuple(box))
             unique_bboxes[id] = box
 
-    comparisons = []  # permuttion of boxes ids
-    # compute permutations over boxes ids
-
-    [comparisons.append(permutation) for permutation in
-     itertools.permutations(unique_bboxes, 2)]
-
-    no_contained_boxes = copy.deepcopy(unique_bboxes)
-    # check if a bbox is contained by another bbox
-    for comparison in comparisons:
-        if is_contained(unique_bboxes[comparison[0]],
-                        unique_bboxes[comparison[1]]):  # retuns True if box 0
-            # is contained in box 1
-
-            try:
-                # remove box that is contained by
-                # any other box
-                no_contained_boxes.pop(comparison[0])
-            except KeyError:
-                # Ensures that at least one of the boxes with the same
-                # coordinates is kept in the final results
-                no_contained_boxes[comparison[0]] = unique_bboxes[
-                    comparison[0]
-                    ]
-                pass  # ignore value error when the box has already
-                # been removed
-        else:
-            continue
+    ids = list(unique_bboxes)
+
+    return _without_contained(unique_bboxes, ids, np.array(
+        [unique_bboxes[id] for id in ids], dtype=float))
+
+
+def filter_bboxes(bboxes: dict, min_width: int = None,
+                  min_height: int = None, max_aspect_ratio: float = None,
+                  min_aspect_ratio: float = None) -> dict:
+    """
+    Filters bounding boxes by size and aspect ratio, and filters out
+    bounding boxes contained by another bounding box. It gives the same
+    results as filter_bbox_by_size() followed by filter_bbox_contained(),
+    but coordinates are converted to an array only once.
+
+    Parameters
+    ----------
+    bboxes: dict
+        bounding boxes. Each bounding box has an id and a list of coordinates
+
+    min_width: int
+        minimum width of bounding box. Optional.
+
+    min_height: int
+        minimum height of bounding box. Optional.
+
+    max_aspect_ratio: float
+        boxes with an aspect ratio (width/height) larger than this value are
+        filtered out. Optional.
+
+    min_aspect_ratio: float
+        boxes with an aspect ratio (width/height) smaller than this value are
+        filtered out. Optional.
+
+    Returns
+    -------
+    dict
+        bounding boxes that pass the size filters and are not completly
+        contained by another bounding box. See filter_bbox_contained().
+    """
+
+    aspect_ratios = []
+    if max_aspect_ratio is not None:
+        aspect_ratios.append((max_aspect_ratio, '>'))
+    if min_aspect_ratio is not None:
+        aspect_ratios.append((min_aspect_ratio, '<'))
+
+    if len(bboxes) == 0:
+        return bboxes
+
+    ids = list(bboxes)
+    coords = np.array([bboxes[id] for id in ids], dtype=float)
+    keep = _size_mask(coords, min_width, min_height, aspect_ratios)
+
+    # boxes with the same coordinates as a previous box are removed, as
+    # in filter_bbox_contained()
+    unique_indices = []
+    seen_bboxes = set()
+    for index in np.flatnonzero(keep):
+        box = tuple(bboxes[ids[index]])
+        if box not in seen_bboxes:
+            seen_bboxes.add(box)
+            unique_indices.append(index)
+
+    unique_ids = [ids[index] for index in unique_indices]
+    unique_bboxes = {id: bboxes[id] for id in unique_ids}
+    if len(unique_ids) <= 1:
+        return unique_bboxes
+
+    return _without_contained(unique_bboxes, unique_ids,
+                              coords[unique_indices])
+
+
+def _without_contained(bboxes: dict, ids: list,
+                       coords: np.ndarray) -> dict:
+    """Removes boxes contained by other boxes. ids and coords are the ids
+    and (N, 4) array of coordinates of bboxes, which have no duplicates.
+    See filter_bbox_contained()."""
+
+    containers = _count_containers(coords)
+
+    # A box contained by another box is removed, but it is added back
+    # every second time it is found to be contained, which keeps boxes
+    # contained by an even number of boxes. Boxes that were added back
+    # are placed after the boxes that were never contained.
+    no_contained_boxes = {id: copy.deepcopy(bboxes[id])
+                          for id, count in zip(ids, containers) if count == 0}
+    for id, count in zip(ids, containers):
+        if count > 0 and count % 2 == 0:
+            no_contained_boxes[id] = bboxes[id]
 
     return no_contained_boxes
 
 
+def _count_containers(coords: np.ndarray) -> np.ndarray:
+    """Counts how many other boxes contain each box in an (N, 4) array of
+    (x1, y1, x2, y2) coordinates.
+
+    Boxes are compared pairwise with NumPy broadcasting when there are
+    few boxes. For many boxes, only pairs of boxes that intersect,
+    as found by a spatial index (STRtree), are compared. This avoids
+    building N x N arrays.
+    """
+
+    x1, y1, x2, y2 = coords.T
+
+    if len(coords) < CONTAINED_INDEX_MIN_BOXES:
+        # contained[i, j] is True if box i is contained in box j
+        contained = ((x1[None, :] <= x1[:, None])
+                     & (y1[None, :] <= y1[:, None])
+                     & (x2[None, :] >= x2[:, None])
+                     & (y2[None, :] >= y2[:, None]))
+        np.fill_diagonal(contained, False)
+        return contained.sum(axis=1)
+
+    boxes = shapely.box(x1, y1, x2, y2)
+    # pairs of boxes whose extents intersect. A box can only be contained
+    # by boxes it intersects
+    inner, outer = STRtree(boxes).query(boxes)
+    contained = ((inner != outer)
+                 & (x1[outer] <= x1[inner]) & (y1[outer] <= y1[inner])
+                 & (x2[outer] >= x2[inner]) & (y2[outer] >= y2[inner]))
+
+    return np.bincount(inner[contained], minlength=len(coords))
+
+
 if __name__ == '__main__':
 
     # example usage
@@ -6,11 +6,22 @@ and returns the elements that are images, texts, and vectors (not implemented).
 Author: M.G. Garcia
 """
 
+import io
+import struct
+import zlib
+from PIL import Image
 from pdfminer.high_level import extract_pages
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfparser import PDFParser
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
+from pdfminer.converter import PDFPageAggregator
+from pdfminer.pdftypes import PDFStream, LITERALS_FLATE_DECODE, int_value
 from pdf2image import convert_from_path
-from typing import Any
+from typing import Any, Iterator
 
 from pdfminer.layout import (
+    LAParams,
     LTPage,
     LTItem,
     LTTextBox,
@@ -85,6 +96,147 @@ def sort_layout_elements(
 
 
 
+def count_pdf_pages(pdf_file: str | PDFDocument) -> int:
+    """
+    Counts the pages of a PDF file without performing layout analysis.
+
+    Parameters
+    ----------
+    pdf_file: str | PDFDocument
+        path to PDF file, or a PDF file already parsed by pdfminer.six
+
+    Returns
+    -------
+    int
+        number of pages in the PDF file
+    """
+
+    if isinstance(pdf_file, PDFDocument):
+        return sum(1 for _ in PDFPage.create_pages(pdf_file))
+
+    with open(pdf_file, 'rb') as fp:
+        return sum(1 for _ in PDFPage.get_pages(fp))
+
+
+def extract_layout_pages(pdf_file: str | PDFDocument,
+                         page_numbers: list = None,
+                         laparams: LAParams = None) -> Iterator[LTPage]:
+    """
+    Extracts the layout of the pages of a PDF file. Works like
+    pdfminer's extract_pages(), but also accepts a PDF file that has
+    already been parsed, so that its cross-reference table and object
+    streams are read only once when the file is analysed several times.
+
+    Parameters
+    ----------
+    pdf_file: str | PDFDocument
+        path to PDF file, or a PDF file already parsed by pdfminer.six
+    page_numbers: list
+        zero-indexed numbers of the pages to extract. If None, all pages
+        are extracted.
+    laparams: LAParams
+        parameters for layout analysis. If None, pdfminer's defaults are
+        used.
+
+    Returns
+    -------
+    Iterator[LTPage]
+        layout of each page, in the order of the PDF file
+    """
+
+    if isinstance(pdf_file, PDFDocument):
+        yield from _layout_pages(pdf_file, page_numbers, laparams)
+    else:
+        with open(pdf_file, 'rb') as fp:
+            yield from _layout_pages(PDFDocument(PDFParser(fp)),
+                                     page_numbers, laparams)
+
+
+def _layout_pages(document: PDFDocument, page_numbers: list = None,
+                  laparams: LAParams = None) -> Iterator[LTPage]:
+    """
+    Runs layout analysis on the pages of a parsed PDF file.
+    """
+
+    resource_manager = PDFResourceManager(caching=True)
+    device = PDFPageAggregator(resource_manager,
+                               laparams=laparams or LAParams())
+    interpreter = PDFPageInterpreter(resource_manager, device)
+    for page_number, page in enumerate(PDFPage.create_pages(document)):
+        if page_numbers is not None and page_number not in page_numbers:
+            continue
+        interpreter.process_page(page)
+        yield device.get_result()
+
+
+# PNG color types by number of color components, for 8-bit images
+_PNG_COLOR_TYPES = {1: 0, 2: 4, 3: 2, 4: 6}
+
+
+def decode_png_predictor_stream(stream: PDFStream) -> bool:
+    """
+    Decodes an image stream compressed with FlateDecode and a PNG
+    predictor using Pillow's PNG decoder. pdfminer.six reverses PNG
+    predictors in pure Python, which is the slowest step when saving
+    such images. The decoded data is stored in the stream, so that
+    pdfminer's ImageWriter doesn't decode it again.
+
+    Parameters
+    ----------
+    stream: PDFStream
+        image stream, e.g. LTImage.stream
+
+    Returns
+    -------
+    bool
+        True if the stream was decoded. False if the stream doesn't use a
+        PNG predictor, or it cannot be decoded this way. In that case
+        the stream is left untouched and pdfminer.six decodes it as usual.
+    """
+
+    if stream.data is not None or stream.rawdata is None or stream.decipher:
+        return False
+    filters = stream.get_filters()
+    if len(filters) != 1 or filters[0][0] not in LITERALS_FLATE_DECODE:
+        return False
+    params = filters[0][1]
+    if not params or int_value(params.get("Predictor", 1)) < 10:
+        return False
+
+    colors = int_value(params.get("Colors", 1))
+    columns = int_value(params.get("Columns", 1))
+    bits_per_component = int_value(params.get("BitsPerComponent", 8))
+    # the number of scanlines is the height of the image
+    rows = int_value(stream.get_any(("Height", "H"), 0))
+    if (bits_per_component != 8 or colors not in _PNG_COLOR_TYPES
+            or rows < 1):
+        return False
+
+    try:
+        header = struct.pack(">IIBBBBB", columns, rows, 8,
+                             _PNG_COLOR_TYPES[colors], 0, 0, 0)
+        png = (b"\x89PNG\r\n\x1a\n" + _png_chunk(b"IHDR", header)
+               + _png_chunk(b"IDAT", stream.rawdata)
+               + _png_chunk(b"IEND", b""))
+        with Image.open(io.BytesIO(png)) as image:
+            data = image.tobytes()
+    except Exception:  # corrupted streams are left to pdfminer
+        return False
+
+    stream.data = data
+    stream.rawdata = None
+    return True
+
+
+def _png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    """
+    Builds a PNG chunk.
+    """
+
+    return (struct.pack(">I", len(data)) + chunk_type + data
+            + struct.pack(">I", zlib.crc32(chunk_type + data)))
+
+
 def convert_pdf_to_image(pdf_file: str,
                          dpi: int = 200,
                          **kargs) -> list[Any]:
@@ -4,31 +4,64 @@ Author: Manuel Garcia Alvarez
 """
 
 import os
+import contextlib
+import itertools
 import pathlib
 import shutil
 import time
 import logging
 import json
+import multiprocessing
+import pickle
+import queue
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import wait, FIRST_COMPLETED
 from logging import Logger
+from dataclasses import dataclass
+from functools import lru_cache, partial
 import visarchpy.ocr as ocr
-from pdfminer.high_level import extract_pages
 from pdfminer.image import ImageWriter
 from pdfminer.pdfparser import PDFSyntaxError
+from pdfminer.psparser import PSException
 from tqdm import tqdm
 from visarchpy.utils import create_output_dir
-from visarchpy.captions import find_caption_by_distance, find_caption_by_text
+from visarchpy.captions import find_captions_by_distance, find_caption_by_text
+from visarchpy.captions import find_caption_indices_by_distance
 from visarchpy.captions import BoundingBox
-from visarchpy.pdf import sort_layout_elements
+from visarchpy.pdf import (sort_layout_elements, count_pdf_pages,
+                            extract_layout_pages,
+                            decode_png_predictor_stream)
 from visarchpy.metadata import Document, Metadata, Visual, FilePath, extract_mods_metadata
 from visarchpy.captions import Offset
 from pdfminer.pdftypes import PDFNotImplementedError
-from pdfminer.layout import LTPage
+from pdfminer.layout import LTPage, LTTextBox, LTAnno, LTImage
 from abc import ABC, abstractmethod
+from typing import Iterator
 
 # Disable PIL image size limit
 import PIL.Image
 PIL.Image.MAX_IMAGE_PIXELS = None
 
+# Maximum number of threads used to copy input files
+MAX_COPY_WORKERS = 8
+
+# Maximum number of consecutive pages rasterized in one call to poppler
+# for OCR analysis. Larger batches start poppler less often, but keep
+# more page images in memory
+OCR_RENDER_BATCH_SIZE = 4
+
+# Name of the directory where the sorted layout of a PDF file is cached,
+# inside the output directory of the PDF file. Each page is cached in its
+# own file, so a cached page is reused however pages are split between
+# workers
+LAYOUT_CACHE_DIR = ".layout_cache"
+
+# Number of tasks per worker when the pages of PDF files are split for
+# layout analysis. More tasks balance the load between workers better,
+# but each task parses its PDF file again
+LAYOUT_TASKS_PER_WORKER = 4
+
 
 # Common interface for all pipelines
 class Pipeline(ABC):
@@ -36,7 +69,8 @@ class Pipeline(ABC):
 
     def __init__(self, data_directory: str, output_directory: str,
                  settings: dict = None, metadata_file: str = None,
-                 temp_directory: str = None, ignore_id: bool = False) -> None:
+                 temp_directory: str = None, ignore_id: bool = False,
+                 max_workers: int = None, cache_layout: bool = False) -> None:
         """"
         Parameters
         ----------
@@ -56,6 +90,18 @@ class Pipeline(ABC):
         ignore_id : bool
             If True, it won't filter PDF by ID (TU Delft dataset specific). Defaults to False.
             As a result, all PDF files in the data directory will be processed.
+        max_workers : int
+            Maximum number of processes used to process PDF files in parallel.
+            If None or 1, PDF files are processed sequentially. Worker
+            processes are started with the spawn method, so a script that
+            runs a pipeline in parallel must call run() under an
+            ``if __name__ == "__main__":`` guard. Defaults to None.
+        cache_layout : bool
+            If True, the layout of PDF files is cached in the output
+            directory, and reused when the pipeline runs again on the same
+            PDF files. Only used by pipelines that perform layout analysis.
+            Cache files are loaded with pickle, so only use it with an
+            output directory that is trusted. Defaults to False.
 
         """
         self.data_directory = data_directory
@@ -64,6 +110,8 @@ class Pipeline(ABC):
         self.metadata_file = metadata_file
         self.temp_directory = temp_directory
         self.ignore_id = ignore_id
+        self.max_workers = max_workers
+        self.cache_layout = cache_layout
 
     @property
     def settings(self) -> dict:
@@ -111,6 +159,32 @@ class Pipeline(ABC):
         """
         self._ignore_id = ignore_id
 
+    @property
+    def max_workers(self) -> int:
+        """Gets the maximum number of worker processes.
+        """
+        return self._max_workers
+
+    @max_workers.setter
+    def max_workers(self, max_workers: int) -> None:
+        """Sets the maximum number of worker processes.
+        """
+        if max_workers is not None and max_workers < 1:
+            raise ValueError("max_workers must be greater than 0")
+        self._max_workers = max_workers
+
+    @property
+    def cache_layout(self) -> bool:
+        """Gets the cache_layout flag.
+        """
+        return self._cache_layout
+
+    @cache_layout.setter
+    def cache_layout(self, cache_layout: bool) -> None:
+        """Sets the cache_layout flag.
+        """
+        self._cache_layout = cache_layout
+
     @abstractmethod
     def run(self) -> dict:
         """Run the pipeline."""
@@ -126,6 +200,9 @@ def extract_visuals_by_layout(pdf: str, metadata: Metadata, data_dir: str,
                               output_dir: str, pdf_file_dir: str,
                               layout_settings: dict, logger: Logger,
                               entry_id: str = None,
+                              page_numbers: list = None,
+                              no_images_queue: queue.Queue = None,
+                              use_cache: bool = False,
                               ) -> dict:
     """Extract visuals from a PDF file using layout analysis to
     a directory.
@@ -149,6 +226,23 @@ def extract_visuals_by_layout(pdf: str, metadata: Metadata, data_dir: str,
         Identifier of the entry being processed.
     layout_settings : dict
         A dictionary containing the settings for the layout analysis.
+    page_numbers : list
+        Zero-indexed numbers of the pages to process. If None, all pages
+        in the PDF file are processed. Defaults to None.
+    no_images_queue : queue.Queue
+        If provided, pages where no images were found are put in this
+        queue as soon as their layout is sorted, as dictionaries with a
+        'page_number' key. This allows other analyses to start before
+        layout analysis finishes. Defaults to None.
+    use_cache : bool
+        If True, the sorted layout of the PDF file is cached in its output
+        directory, and reused by later runs when the PDF file and the
+        minimum image size haven't changed. Images saved by the first run
+        are reused as well, so caption settings can be tuned without
+        analysing the layout again. Pages are cached one by one, so pages
+        cached by a run are reused whichever 'page_numbers' a later run
+        uses. Cache files are loaded with pickle, so only use it with an
+        output directory that is trusted. Defaults to False.
 
     Returns
     -------
@@ -161,213 +255,394 @@ def extract_visuals_by_layout(pdf: str, metadata: Metadata, data_dir: str,
         {'no_images_pages': <list of pages where no images were found>,
         "metadata": <Metadata object>}
         ```
+        Pages in 'no_images_pages' only contain the 'page_number' key.
 
-    Raises
-    ------
-    Warning PDFSyntaxError
+    Notes
+    -----
+    The following errors are not raised. They are reported to the logger,
+    and the PDF file or the image that caused them is skipped.
+
+    PDFSyntaxError
         If the PDF file is malformed or corrupted.
-    Warning AssertionError
+    AssertionError
         If the PDF file contains an unsupported font.
-    Warning TypeError
+    TypeError
         If PDF file encounters a bug with pdfminer.
-    Warning ValueError
+    ValueError
         If image writer cannot save MCYK images with 4 bits per pixel.
         Issue: https://github.com/pdfminer/pdfminer.six/pull/854
-    Warning UnboundLocalError
+    UnboundLocalError
         If image writer's decoder doesn't support image stream.
-    Warning PDFNotImplementedError
+    PDFNotImplementedError
         If image writer encounters that PDF stream has an unsupported format.
-    Warning PIL.UnidentifiedImageError
+    PIL.UnidentifiedImageError
         If image writer encounters an error with io.BytesIO.
-    Warning IndexError
+    IndexError
         If image writer encounters an error with PNG predictor for some image.
-    Warning KeyError
+    KeyError
         If image writer encounters an error with JBIG2Globals decoder.
-    Warning TypeError
+    TypeError
         If image writer encounters an error with PDFObjRef filter.
     """
 
     pdf_root = data_dir
-    pdf_file_path = os.path.basename(pdf).split("/")[-1]  # file name
-    # with extension
-    logger.info("Processing file: " + pdf_file_path)
+    pdf_file_path = pathlib.PurePath(pdf).name  # file name with extension
+    logger.info("Processing file: %s", pdf_file_path)
 
     # create document object
     pdf_formatted_path = FilePath(root_path=pdf_root, file_path=pdf_file_path)
     pdf_document = Document(pdf_formatted_path)
     metadata.add_document(pdf_document)
+    pdf_full_path = pdf_document.location.full_path()
 
     # PREPARE OUTPUT DIRECTORY
     # a directory is created for each PDF file
     entry_directory = os.path.join(output_dir, entry_id)
     # returns a pathlib object
     image_directory = create_output_dir(entry_directory, pdf_file_dir)
+    # location of images relative to output_dir, shared by all visuals
+    visual_directory = entry_id + '/' + pdf_file_dir + '/'
     # PROCESS PDF
-    pdf_pages = extract_pages(pdf_document.location.full_path())
-    pages = []
+    # the sorted layout of a previous run is reused if the PDF file and
+    # the layout settings haven't changed
+    pages = None
+    layout_cache = None  # collects the sorted layout to be cached
+    if use_cache:
+        cache_dir = image_directory / LAYOUT_CACHE_DIR
+        cache_key = _layout_cache_key(pdf_full_path, entry_id,
+                                      layout_settings)
+        pages = _load_layout_cache(cache_dir, cache_key,
+                                   _layout_page_numbers(pdf_full_path,
+                                                        page_numbers),
+                                   image_directory)
     no_image_pages = []  # collects pages where no images were found
     # by layout analysis
-    # this checks for malformed or corrupted PDF files, and
-    # unsupported fonts and some bugs in pdfminer
-
-    try:
-        for page in tqdm(pdf_pages, desc="Sorting pages layout\
-                            analysis", unit="pages"):
-            elements = sort_layout_elements(
-                page,
-                img_width=layout_settings["layout"]["image"]["width"],
-                img_height=layout_settings["layout"]["image"]["height"]
-            )
-            pages.append(elements)
-
-    except PDFSyntaxError:  # skip malformed or corrupted PDF files
-        logger.error("PDFSyntaxError. Couldn't read: "
-                     + pdf_document.location.file_path)
-        Warning("PDFSyntaxError. Couldn't read: " +
-                pdf_document.location.file_path)
-    except AssertionError as e:  # skip unsupported fonts
-        logger.error("AssertionError. Unsupported font: "
-                     + pdf_document.location.file_path + str(e))
-        Warning("AssertionError. Unsupported font: " +
-                pdf_document.location.file_path + str(e))
-    except TypeError as e:  # skip bug in pdfminer
-        # no_image_pages.append(page) # pass page to OCR analysis
-        logger.error("TypeError. Bug with Predictor: "
-                     + pdf_document.location.file_path + str(e))
-        Warning("TypeError. Bug with Predictor: " +
-                pdf_document.location.file_path + str(e))
+    if pages is not None:
+        logger.info("Using cached layout: %s", cache_dir)
+        sorted_pages = iter(pages)
+        total_pages = len(pages)
     else:
-        # TODO: test this only happnes when no exception is raised
-        del elements  # free memory
+        pdf_pages = extract_layout_pages(
+            pdf_full_path, page_numbers=page_numbers)
+        sorted_pages = _sort_layout_pages(pdf_pages, layout_settings,
+                                          page_numbers)
+        total_pages = None
+        if use_cache:  # collects the sorted layout of each page
+            layout_cache = []
+
+    layout_offset_dist = _caption_offset(
+        layout_settings["layout"]["caption"]["offset"][0],
+        layout_settings["layout"]["caption"]["offset"][1])
+    # offset and direction are the same for all pages of the PDF file
+    match_captions = partial(
+        find_captions_by_distance, offset=layout_offset_dist,
+        direction=layout_settings["layout"]["caption"]["direction"])
+
+    # one image writer is shared by all pages of the PDF file
+    iw = ImageWriter(image_directory)
 
-    layout_offset_dist = Offset(layout_settings["layout"]["caption"]
-                                ["offset"][0],
-                                layout_settings["layout"]["caption"]
-                                ["offset"][1])
-    
     # PROCESS PAGE USING LAYOUT ANALYSIS
-    for page in tqdm(pages,
-                     desc="layout analysis", total=len(pages),
-                     unit="sorted pages"):
-
-        iw = ImageWriter(image_directory)
+    # Pages are sorted and processed one at a time, so the layout of only
+    # one page is kept in memory
+    progress = tqdm(desc="layout analysis", total=total_pages,
+                    unit="pages")
+    layout_complete = False
+    while True:
+        # this checks for malformed or corrupted PDF files, and
+        # unsupported fonts and some bugs in pdfminer. Only errors raised
+        # while pages are read and sorted are caught
+        try:
+            page = next(sorted_pages, None)
+        except PDFSyntaxError:  # skip malformed or corrupted PDF files
+            logger.error("PDFSyntaxError. Couldn't read: %s",
+                         pdf_document.location.file_path)
+            break
+        except AssertionError as e:  # skip unsupported fonts
+            logger.error("AssertionError. Unsupported font: %s%s",
+                         pdf_document.location.file_path, e)
+            break
+        except TypeError as e:  # skip bug in pdfminer
+            logger.error("TypeError. Bug with Predictor: %s%s",
+                         pdf_document.location.file_path, e)
+            break
+        if page is None:  # all pages were read without errors
+            layout_complete = True
+            break
+        progress.update()
 
         if page["images"] == []:  # collects pages where no images
-            # were found by layout analysis # TODO: fix this
-            no_image_pages.append(page)
-        for img in page["images"]:
+            # were found by layout analysis
+            no_image_pages.append({"page_number": page["page_number"]})
+            if no_images_queue is not None:
+                no_images_queue.put({"page_number": page["page_number"]})
+        if layout_cache is not None:
+            cached_images = []  # images are added once they are saved
+            layout_cache.append({
+                "page_number": page["page_number"],
+                "texts": [_cached_text_box(text_box)
+                          for text_box in page["texts"]],
+                "images": cached_images,
+                "vectors": []})  # vectors are not used, not cached
+        # Search for captions using proximity to images
+        # This may generate multiple matches per image
+        page_matches = match_captions(page["images"], page["texts"])
+        for img, bbox_matches in zip(page["images"], page_matches):
             visual = Visual(document_page=page["page_number"],
                             document=pdf_document,
                             bbox=img.bbox, bbox_units="pt")
-            # Search for captions using proximity to image
-            # This may generate multiple matches
-            bbox_matches = []
-            for _text in page["texts"]:
-                match = find_caption_by_distance(
-                    img,
-                    _text,
-                    offset=layout_offset_dist,
-                    direction=layout_settings["layout"]["caption"]["direction"]
-                    )
-                if match:
-                    bbox_matches.append(match)
             # Search for captions using proximity (offset) and text
             # analyses (keywords)
             if len(bbox_matches) == 0:
                 pass  # don't set any caption
             elif len(bbox_matches) == 1:
-                caption = ""
-                for text_line in bbox_matches[0]:
-                    caption += text_line.get_text().strip() 
+                caption = "".join(text_line.get_text().strip()
+                                  for text_line in bbox_matches[0])
                 visual.set_caption(caption)  # TODO: fix this
             else:  # more than one matches in bbox_matches
-                for _text in bbox_matches:
-                    text_match = find_caption_by_text(
-                        _text,
-                        keywords=layout_settings["layout"]["caption"]
-                        ["keywords"]
-                        )
-                if text_match:
-                    caption = ""
-                    for text_line in bbox_matches[0]:
-                        caption += text_line.get_text().strip()
                 # Set the caption to the first text match.
                 # All other matches will be ignored.
                 # This may introduce errors, but it is better than
                 # having multiple captions
+                text_match = next(
+                    (_text for _text in bbox_matches
+                     if find_caption_by_text(
+                         _text,
+                         keywords=layout_settings["layout"]["caption"]
+                         ["keywords"]
+                         )),
+                    None)
+                if text_match:
+                    caption = "".join(text_line.get_text().strip()
+                                      for text_line in text_match)
                     try:
                         visual.set_caption(caption)  # TODO: fix this
                     except Warning:  # ignore warnings when caption is
                         # already set.
-                        logger.warning("Caption already set for image: "+img.name)
-                        Warning("Caption already set for image: "+img.name)
+                        logger.warning("Caption already set for image: %s", img.name)
                         pass
 
-            # rename image name to include page number
-            img.name = str(entry_id)+"-page"+str(
-                page["page_number"])+"-"+img.name
-            # save image to file
-            try:
-                image_file_name = iw.export_image(img)
-                # returns image file name,
-                # which last part is automatically generated by
-                # pdfminer to guarantee uniqueness
-            except ValueError:
-                # issue with MCYK images with 4 bits per pixel
-                # https://github.com/pdfminer/pdfminer.six/pull/854
-                logger.warning("Image with unsupported format wasn't\
-                                saved:" + img.name)
-                Warning("Image with unsupported format wasn't saved:"
-                        + img.name)
-            except UnboundLocalError:
-                logger.warning("Decocder doesn't support image stream,\
-                                therefore not saved:" + img.name)
-                Warning("Decocder doesn't support image stream,\
-                                therefore not saved:" + img.name)
-            except PDFNotImplementedError:
-                logger.warning("PDF stream unsupported format,  image\
-                                not saved:" + img.name)
-                Warning("PDF stream unsupported format,  image\
-                                not saved:" + img.name)
-            except PIL.UnidentifiedImageError:
-                logger.warning("PIL.UnidentifiedImageError io.BytesIO,\
-                                image not saved:" + img.name)
-                Warning("PIL.UnidentifiedImageError io.BytesIO,\
-                                image not saved:" + img.name)
-            except IndexError:  # avoid decoding errors in PNG
-                # predictor for some images
-                logger.warning("IndexError, png predictor/decoder\
-                                failed:" + img.name)
-                Warning("IndexError, png predictor/decoder\
-                        failed:" + img.name)
-            except KeyError:  # avoid decoding error of JBIG2 images
-                logger.warning("KeyError, JBIG2Globals decoder failed:"
-                               + img.name)
-                Warning("KeyError, JBIG2Globals decoder failed:"
-                        + img.name)
-            except TypeError:  # avoid filter error with PDFObjRef
-                logger.warning("TypeError, filter error PDFObjRef:"
-                               + img.name)
-                Warning("TypeError, filter error PDFObjRef:"
-                        + img.name)
+            if isinstance(img, _CachedImage):
+                # the image was saved when the layout was cached
+                image_file_name = img.file_name
             else:
-                visual.set_location(
-                                    FilePath(root_path=output_dir,
-                                             file_path=entry_id
-                                             + '/' + pdf_file_dir
-                                             + '/' + image_file_name))
-                # add visual to entry
-                metadata.add_visual(visual)
-    del pages  # free memory
+                # rename image name to include page number
+                img.name = str(entry_id)+"-page"+str(
+                    page["page_number"])+"-"+img.name
+                # save image to file
+                image_file_name = _export_image(iw, img, logger)
+                if layout_cache is not None:
+                    cached_images.append(_CachedImage(
+                        name=img.name, bbox=img.bbox,
+                        file_name=image_file_name))
+            if image_file_name is None:  # the image couldn't be saved
+                continue
+            visual.set_location(
+                                FilePath(root_path=output_dir,
+                                         file_path=visual_directory
+                                         + image_file_name))
+            # add visual to entry
+            metadata.add_visual(visual)
+    progress.close()
+    del sorted_pages, pages  # free memory
+
+    # only layouts of PDF files that were read without errors are cached
+    if layout_cache is not None and layout_complete:
+        _save_layout_cache(cache_dir, cache_key, layout_cache)
 
     return {'no_images_pages': no_image_pages, "metadata": metadata}
 
 
+def _sort_layout_pages(pdf_pages: Iterator, layout_settings: dict,
+                       page_numbers: list = None) -> Iterator[dict]:
+    """Sorts the layout elements of each page of a PDF file, one page at a
+    time, as pages are yielded by pdfminer. See sort_layout_elements().
+    page_numbers are the zero-indexed numbers of the pages in pdf_pages,
+    or None if pdf_pages has all pages of the PDF file."""
+
+    page_ids = sorted(page_numbers) if page_numbers is not None else None
+
+    for counter, page in enumerate(pdf_pages):
+        elements = sort_layout_elements(
+            page,
+            img_width=layout_settings["layout"]["image"]["width"],
+            img_height=layout_settings["layout"]["image"]["height"]
+        )
+        if page_ids is not None:
+            # pdfminer numbers pages in the order they are processed
+            elements["page_number"] = page_ids[counter] + 1
+        yield elements
+
+
+def _export_image(iw: ImageWriter, img: LTImage,
+                  logger: Logger) -> str | None:
+    """Saves an image found by layout analysis to the directory of an
+    image writer. Images that can't be decoded are logged and skipped.
+
+    Returns
+    -------
+    str or None
+        The name of the image file, which last part is automatically
+        generated by pdfminer to guarantee uniqueness. None if the image
+        couldn't be saved.
+    """
+
+    try:
+        # decode PNG predictors in C instead of in pdfminer
+        decode_png_predictor_stream(img.stream)
+        return iw.export_image(img)
+    except ValueError:
+        # issue with MCYK images with 4 bits per pixel
+        # https://github.com/pdfminer/pdfminer.six/pull/854
+        logger.warning("Image with unsupported format wasn't\
+                        saved:%s", img.name)
+    except UnboundLocalError:
+        logger.warning("Decocder doesn't support image stream,\
+                        therefore not saved:%s", img.name)
+    except PDFNotImplementedError:
+        logger.warning("PDF stream unsupported format,  image\
+                        not saved:%s", img.name)
+    except PIL.UnidentifiedImageError:
+        logger.warning("PIL.UnidentifiedImageError io.BytesIO,\
+                        image not saved:%s", img.name)
+    except IndexError:  # avoid decoding errors in PNG
+        # predictor for some images
+        logger.warning("IndexError, png predictor/decoder\
+                        failed:%s", img.name)
+    except KeyError:  # avoid decoding error of JBIG2 images
+        logger.warning("KeyError, JBIG2Globals decoder failed:%s",
+                       img.name)
+    except TypeError:  # avoid filter error with PDFObjRef
+        logger.warning("TypeError, filter error PDFObjRef:%s",
+                       img.name)
+
+    return None
+
+
+@dataclass
+class _CachedImage:
+    """An image found by layout analysis, whose image file was saved
+    when the layout was cached. It replaces the LTImage, which can't be
+    pickled."""
+
+    name: str
+    bbox: tuple
+    file_name: str = None  # None if the image couldn't be saved
+
+
+@lru_cache(maxsize=None)
+def _caption_offset(distance: float, unit: str) -> Offset:
+    """Returns the offset for caption search given in the settings.
+    Results are cached, so the settings of a pipeline are validated once
+    instead of once per PDF file or page."""
+
+    return Offset(distance, unit)
+
+
+def _cached_text_box(text_box: LTTextBox) -> LTTextBox:
+    """Returns a copy of a text box that only keeps the text of its lines,
+    which is what caption search uses. Characters and fonts are dropped,
+    so that the copy is small and can be pickled."""
+
+    cached = type(text_box)()
+    cached.set_bbox(text_box.bbox)
+    # lines are replaced by their text, bypassing add(), which expects
+    # elements with a bounding box
+    cached._objs = [LTAnno(text_line.get_text()) for text_line in text_box]
+
+    return cached
+
+
+def _layout_page_numbers(pdf_file: str, page_numbers: list = None) -> list:
+    """Returns the one-indexed numbers of the pages whose layout is
+    analysed, given their zero-indexed numbers. If page_numbers is None,
+    the pages of the PDF file are counted. Returns None if the PDF file
+    can't be read, so that its layout isn't taken from the cache."""
+
+    if page_numbers is not None:
+        return [page_number + 1 for page_number in sorted(page_numbers)]
+
+    try:
+        return list(range(1, count_pdf_pages(pdf_file) + 1))
+    except Exception:  # errors are reported by layout analysis
+        return None
+
+
+def _layout_cache_file(cache_dir: pathlib.Path,
+                       page_number: int) -> pathlib.Path:
+    """Returns the path of the file where the layout of a page is cached."""
+
+    return cache_dir / f"page-{page_number}.pkl"
+
+
+def _layout_cache_key(pdf_file: str, entry_id: str,
+                      layout_settings: dict) -> tuple:
+    """Returns the key that identifies a cached layout. The layout depends
+    on the PDF file and the minimum image size. Caption settings are not
+    part of the key, so captions can be tuned without analysing the layout
+    again."""
+
+    return (os.path.abspath(pdf_file), os.path.getmtime(pdf_file),
+            os.path.getsize(pdf_file), entry_id,
+            layout_settings["layout"]["image"]["width"],
+            layout_settings["layout"]["image"]["height"])
+
+
+def _load_layout_cache(cache_dir: pathlib.Path, cache_key: tuple,
+                       page_numbers: list,
+                       image_directory: pathlib.Path) -> list:
+    """Loads the cached layout of some pages. Returns None if a page isn't
+    cached, was cached for another key, or an image file of a page is
+    missing. Cache files are loaded with pickle, so they must come from a
+    trusted output directory."""
+
+    if not page_numbers:
+        return None
+
+    pages = []
+    for page_number in page_numbers:
+        try:
+            with open(_layout_cache_file(cache_dir, page_number), "rb") as f:
+                cache = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:  # corrupted or incompatible caches are ignored
+            return None
+
+        if cache.get("key") != cache_key:
+            return None
+        page = cache["page"]
+        for image in page["images"]:
+            if (image.file_name is not None
+                    and not (image_directory / image.file_name).exists()):
+                return None
+        pages.append(page)
+
+    return pages
+
+
+def _save_layout_cache(cache_dir: pathlib.Path, cache_key: tuple,
+                       pages: list) -> None:
+    """Saves the layout of pages to the cache, one file per page. Files
+    are replaced at once, so that an interrupted run doesn't leave a
+    partial cache, and the cache of a page made for another key is
+    overwritten."""
+
+    cache_dir.mkdir(exist_ok=True)
+    for page in pages:
+        cache_file = _layout_cache_file(cache_dir, page["page_number"])
+        temp_file = cache_file.with_name(cache_file.name + ".tmp")
+        with open(temp_file, "wb") as f:
+            pickle.dump({"key": cache_key, "page": page}, f)
+        os.replace(temp_file, cache_file)
+
+
 def extract_visuals_by_ocr(metadata: Metadata, data_dir: str,
                            output_dir: str, pdf_file_dir: str, logger: Logger,
                            entry_id: str = None, ocr_settings: dict = None,
                            pdf: str = None,
-                           lt_pages: list[LTPage] = None) -> dict:
+                           lt_pages: list[LTPage] | queue.Queue = None,
+                           max_workers: int = None,
+                           executor: ProcessPoolExecutor = None) -> dict:
     """Extract visuals from a PDF file using OCR analysis to
     a directory.
 
@@ -391,9 +666,20 @@ def extract_visuals_by_ocr(metadata: Metadata, data_dir: str,
     pdf : str
         Path to the PDF file as returned by find_pdf_files(). If
         None, 'lt_pages' must be provided.
-    lt_pages : list[LTPage]
+    lt_pages : list[LTPage] | queue.Queue
         A list of pdfminer.six type pages to be processed. If None,
-        'pdf' must be provided.
+        'pdf' must be provided. It can also be an iterator of pages, in
+        which case pages are processed as they are yielded, or a queue
+        of pages ending with None. Consecutive pages waiting in a queue
+        are rasterized together.
+    max_workers : int
+        Maximum number of processes used to analyse pages in parallel.
+        If None or 1, pages are analysed sequentially, unless 'executor'
+        is provided. Defaults to None.
+    executor : ProcessPoolExecutor
+        A pool of processes where pages are analysed. It allows several
+        PDF files to share the same pool. If None, a new pool is created
+        when pages are analysed in parallel. Defaults to None.
 
     Returns
     -------
@@ -419,24 +705,36 @@ def extract_visuals_by_ocr(metadata: Metadata, data_dir: str,
         raise ValueError("No PDF file or LTPage list. At least one\
                          of them must be provided.")
 
+    page_queue = None
+    if isinstance(lt_pages, queue.Queue):
+        page_queue = lt_pages
+        lt_pages = iter(page_queue.get, None)
+
+    if lt_pages is not None and not isinstance(lt_pages, list):
+        # wait for the first page, an empty iterator is handled as an
+        # empty list
+        lt_pages = iter(lt_pages)
+        first_page = next(lt_pages, None)
+        lt_pages = [] if first_page is None else itertools.chain(
+            [first_page], lt_pages)
+
     if isinstance(lt_pages, list) and len(lt_pages) == 0:
         # This handles the case: chaining layout analysis and
         # OCR analysis, and layout analysis returns an empty
         # list of pages
         logger.warning("Found empty list of LTPages. No OCR performed.")
-        Warning("lt_pages contains an empy list. No OCR performed.")
         return {'no_images_pages': [], "metadata": metadata}
 
     pdf_root = data_dir
 
     if pdf:
-        pdf_file_path = os.path.basename(pdf).split("/")[-1]  # file name
+        pdf_file_path = pathlib.PurePath(pdf).name  # file name
     elif lt_pages is not None:  # to process empty list of pages
         # get last document in list. This assums that the last document
         # is the document being processed when the metadata object is
         # reused
         pdf_file_path = metadata.documents[-1].location.file_path
-    logger.info("Processing file: " + pdf_file_path)
+    logger.info("Processing file: %s", pdf_file_path)
 
     # create document object
     pdf_formatted_path = FilePath(root_path=pdf_root, file_path=pdf_file_path)
@@ -449,165 +747,402 @@ def extract_visuals_by_ocr(metadata: Metadata, data_dir: str,
     # returns a pathlib object
     image_directory = create_output_dir(entry_directory, pdf_file_dir)
     # PROCESS PDF
-    # pdf_pages = extract_pages(pdf_document.location.full_path())
     no_image_pages = []  # collects pages where no images were found
 
     # PROCESS PAGE USING OCR ANALYSIS
-    logger.info("OCR input image resolution (DPI): " + str(
-        ocr_settings["ocr"]["resolution"]))
+    logger.info("OCR input image resolution (DPI): %s",
+                ocr_settings["ocr"]["resolution"])
 
     if lt_pages is not None:
         pages = lt_pages
     else:
-        pdf_pages = extract_pages(pdf)  # returns generator
-        # intantiate generator
-        
-        # TODO: find a better way to make this works for both cases:
-        # when OCR should be performed on all pages, and when it should
-        # be performed only on pages where no images were found by layout.
-        # This is a temporary solution.
+        # OCR is performed on all pages. Only page numbers are needed,
+        # so pages are counted without layout analysis
         pages = []
         try:
-            for page in pdf_pages:
-                elements = sort_layout_elements(
-                    page,
-                    img_width=ocr_settings["ocr"]["image"]["width"],
-                    img_height=ocr_settings["ocr"]["image"]["height"]
-                )
-                
-                pages.append(elements)
-
+            total_pages = count_pdf_pages(pdf)
         except PDFSyntaxError:  # skip malformed or corrupted PDF files
-            logger.error("PDFSyntaxError. Couldn't read: " + pdf)
-        except AssertionError as e:  # skip unsupported fonts
-            # no_image_pages.append(page) # pass page to OCR analysis
-            logger.error("AssertionError. Unsupported font: " + pdf + str(e))
-        except TypeError as e:  # skip bug in pdfminer
-            # no_image_pages.append(page) # pass page to OCR analysis
-            logger.error("TypeError. Bug with Predictor: " + pdf + str(e))
+            logger.error("PDFSyntaxError. Couldn't read: %s", pdf)
         else:
-            del elements  # free memory
+            pages = [{"page_number": page_number}
+                     for page_number in range(1, total_pages + 1)]
+
+    # pages is either a list, or an iterator that yields pages while
+    # layout analysis is still running. In both cases pages are analysed
+    # as soon as they are available
+    page_numbers = (page["page_number"] for page in pages)
+    total_pages = len(pages) if isinstance(pages, list) else None
+    workers = max_workers or 1
+    sequential = executor is None and (workers == 1 or (
+        total_pages is not None and total_pages <= 1))
+    if total_pages is not None:
+        # consecutive pages are rasterized together. Batches are kept
+        # small enough to give every worker a share of the pages
+        batch_size = max(1, min(OCR_RENDER_BATCH_SIZE,
+                                total_pages // workers))
+        page_batches = _batch_pages(page_numbers, batch_size)
+    elif page_queue is not None:
+        # pages are analysed as they are queued, together with the
+        # consecutive pages queued meanwhile
+        page_batches = _queued_page_batches(
+            first_page["page_number"], page_queue, OCR_RENDER_BATCH_SIZE)
+    else:  # pages are analysed one by one, as they are yielded
+        page_batches = ([page_number] for page_number in page_numbers)
+
+    progress = tqdm(desc="OCR analysis", total=total_pages, unit="OCR pages")
+    if sequential:
+        # images of a batch are saved while the next batch is rasterized
+        # and analysed
+        with _ImageSaver() as image_saver:
+            for page_batch in page_batches:
+                for visual in _ocr_pages(page_batch, pdf_document,
+                                         output_dir, pdf_file_dir,
+                                         image_directory, ocr_settings,
+                                         logger, entry_id, image_saver):
+                    metadata.add_visual(visual)
+                progress.update(len(page_batch))
+    else:
+        # pages are rasterized and analysed in worker processes, only the
+        # metadata of visuals is sent back
+        log_file = _log_file(logger)
+        pool = executor or _process_pool(max_workers)
+        try:
+            futures = []
+            for page_batch in page_batches:
+                futures.append((page_batch, pool.submit(
+                    _ocr_pages_worker, page_batch, pdf_document,
+                    output_dir, pdf_file_dir, image_directory,
+                    ocr_settings, logger.name, log_file, entry_id)))
+                if page_queue is not None:
+                    # the next pages are taken from the queue once a
+                    # worker is free, so that pages queued meanwhile are
+                    # rasterized together
+                    running = [future for _, future in futures
+                               if not future.done()]
+                    if len(running) >= workers:
+                        wait(running, return_when=FIRST_COMPLETED)
+            for page_batch, future in futures:
+                for visual in future.result():
+                    visual.document = pdf_document  # same object as in
+                    # the metadata, not a copy
+                    metadata.add_visual(visual)
+                progress.update(len(page_batch))
+        finally:
+            if executor is None:  # a pool shared by the caller isn't closed
+                pool.shutdown()
+    progress.close()
+
+    return {'no_images_pages': no_image_pages, "metadata": metadata}
+
+
+def _ocr_page(page_number: int, pdf_document: Document, output_dir: str,
+              pdf_file_dir: str, image_directory: str, ocr_settings: dict,
+              logger: Logger, entry_id: str = None,
+              page_image: list = None, ocr_results: dict = None,
+              image_saver: "_ImageSaver" = None) -> list:
+    """Extracts visuals from a single page of a PDF file using OCR analysis.
+    Images of the visuals are saved to the image directory.
+
+    Parameters
+    ----------
+    page_number : int
+        Number of the page in the PDF file, starting at 1.
+    pdf_document : Document
+        The document being processed.
+    output_dir : str
+        Path to the output directory where visuals will be saved.
+    pdf_file_dir : str
+        Name of the directory inside the output directory where the
+        results are saved.
+    image_directory : str
+        Path to the directory where images will be saved.
+    ocr_settings : dict
+        A dictionary containing setting for OCR analysis.
+    logger : Logger
+        A logger object.
+    entry_id : str
+        Identifier of the entry being processed.
+    page_image : list
+        The page already rasterized, as a list with one Pillow Image. If
+        None, the page is rasterized from the PDF file. Defaults to None.
+    ocr_results : dict
+        The results of OCR analysis of the page, as returned by
+        ocr.extract_bboxes_from_horc(). If None, the page image is
+        analysed with Tesseract. Defaults to None.
+    image_saver : _ImageSaver
+        Saves the images of the visuals in a thread. If None, images are
+        saved before returning. Defaults to None.
+
+    Returns
+    -------
+    list
+        A list of Visual objects found in the page.
+    """
 
-    for page in tqdm(pages, desc="OCR analysis",  total=len(pages),
-                     unit="OCR pages"):
+    visuals = []
 
-        page_image = ocr.convert_pdf_to_image(  
-            pdf_formatted_path.full_path(),
+    if page_image is None:
+        page_image = ocr.convert_pdf_to_image(
+            pdf_document.location.full_path(),
             dpi=ocr_settings["ocr"]["resolution"],
-            first_page=page["page_number"],
-            last_page=page["page_number"],
+            first_page=page_number,
+            last_page=page_number,
             )
 
+    if ocr_results is None:
         ocr_results = ocr.extract_bboxes_from_horc(
             page_image, config=ocr_settings["ocr"]["tesseract"],
             entry_id=entry_id,
-            page_number=page["page_number"],
+            page_number=page_number,
             resize=ocr_settings["ocr"]["resize"]
             )
 
-        if ocr_results:  # skips pages with no results
-            page_key = ocr_results.keys()
-            page_id = list(page_key)[0]
-
-            # FILTERING OCR RESULTS
-            # filter by bbox size
-            filtered_width_height = ocr.filter_bbox_by_size(
-                                    ocr_results[page_id]["bboxes"],
-                                    min_width=ocr_settings["ocr"]["image"]
-                                    ["width"],
-                                    min_height=ocr_settings["ocr"]["image"]
-                                    ["height"],
-                                    )
-
-            ocr_results[page_id]["bboxes"] = filtered_width_height
-
-            # # filter bboxes that are extremely horizontally long
-            filtered_ratio = ocr.filter_bbox_by_size(
-                                                    ocr_results[page_id]
-                                                    ["bboxes"],
-                                                    aspect_ratio=(20/1, ">")
-                                                    )
-            ocr_results[page_id]["bboxes"] = filtered_ratio
-
-            # filter boxes with extremely vertically long
-            filtered_ratio = ocr.filter_bbox_by_size(ocr_results[page_id]
-                                                     ["bboxes"],
-                                                     aspect_ratio=(1/20, "<")
-                                                     )
-            ocr_results[page_id]["bboxes"] = filtered_ratio
-
-            # filter boxes contained by larger boxes
-            filtered_contained = ocr.filter_bbox_contained(ocr_results[page_id]
-                                                           ["bboxes"])
-            ocr_results[page_id]["bboxes"] = filtered_contained
-
-            # exclude pages with no bboxes (a.k.a. no inner images)
-            if len(ocr_results[page_id]["bboxes"]) > 0:
-                # loop over imageboxes
-                for bbox_id in ocr_results[page_id]["bboxes"]:
-                    # bbox of image in page
-                    bbox_cords = ocr_results[page_id]["bboxes"][bbox_id]
-
-                    visual = Visual(document=pdf_document,
-                                    document_page=page["page_number"],
-                                    bbox=bbox_cords, bbox_units="px")
-
-                    # Search for captions using proximity to image
-                    # This may generate multiple matches
-                    bbox_matches = []
-                    bbox_object = BoundingBox(tuple(bbox_cords),
-                                              ocr_settings["ocr"]["resolution"])
-
-                    for text_box in ocr_results[page_id]["text_bboxes"].items():
-
-                        text_cords = text_box[1]
-                        text_object = BoundingBox(tuple(text_cords),
-                                                  ocr_settings["ocr"]
-                                                  ["resolution"])
-
-                        _offset = Offset(ocr_settings["ocr"]["caption"]
-                                         ["offset"][0],
-                                         ocr_settings["ocr"]["caption"]
-                                         ["offset"][1])
-                        match = find_caption_by_distance(
-                            bbox_object,
-                            text_object,
-                            offset=_offset,
-                            direction=ocr_settings["ocr"]["caption"]
-                            ["direction"]
-                        )
-                        if match:
-                            bbox_matches.append(match)
-
-                    if len(bbox_matches) == 0:  # if more than one bbox 
-                        # matches, skip and do text analysis
-                        pass
-                    else:
-                        # get text from image
-                        for match in bbox_matches:
-                            ocr_caption = ocr.region_to_string(page_image[0],
-                                                               match.bbox_px(),
-                                                               config=ocr_settings["ocr"]["tesseract"])
-
-                            if ocr_caption:
-                                try:
-                                    visual.set_caption(ocr_caption)
-                                except Warning:  # ignore warnings when caption
-                                    # is already set.
-                                    logger.warning("Caption already set for: "
-                                                   + str(match.bbox()))
-
-                    visual.set_location(FilePath(root_path=output_dir,
-                                                 file_path=entry_id + '/'
-                                                 + pdf_file_dir + '/'
-                                                 + f'{page_id}-{bbox_id}.png'))
-
-                    metadata.add_visual(visual)
+    if ocr_results:  # skips pages with no results
+        page_key = ocr_results.keys()
+        page_id = list(page_key)[0]
+
+        # FILTERING OCR RESULTS
+        # filter by bbox size, boxes that are extremely horizontally
+        # or vertically long, and boxes contained by larger boxes,
+        # in a single pass
+        ocr_results[page_id]["bboxes"] = ocr.filter_bboxes(
+            ocr_results[page_id]["bboxes"],
+            min_width=ocr_settings["ocr"]["image"]["width"],
+            min_height=ocr_settings["ocr"]["image"]["height"],
+            max_aspect_ratio=20/1, min_aspect_ratio=1/20
+            )
 
+        # exclude pages with no bboxes (a.k.a. no inner images)
+        if len(ocr_results[page_id]["bboxes"]) > 0:
+            # Search for captions using proximity to images
+            # This may generate multiple matches per image.
+            # Bounding boxes are matched as arrays of pixel coordinates
+            text_bboxes = np.array(list(
+                ocr_results[page_id]["text_bboxes"].values()),
+                dtype=float).reshape(-1, 4)
+            # text recognized by OCR for each text bbox, text_bboxes and
+            # texts share the same ids
+            text_strings = [ocr_results[page_id]["texts"][text_id]
+                            for text_id in ocr_results[page_id]["text_bboxes"]]
+            _offset = _caption_offset(
+                ocr_settings["ocr"]["caption"]["offset"][0],
+                ocr_settings["ocr"]["caption"]["offset"][1])
+            page_matches = find_caption_indices_by_distance(
+                np.array(list(ocr_results[page_id]["bboxes"].values()),
+                         dtype=float),
+                text_bboxes,
+                offset=_offset,
+                direction=ocr_settings["ocr"]["caption"]["direction"],
+                pixels=True
+            )
+            # location of images relative to output_dir
+            visual_directory = entry_id + '/' + pdf_file_dir + '/'
+            # loop over imageboxes
+            for bbox_id, bbox_matches in zip(
+                    ocr_results[page_id]["bboxes"], page_matches):
+                # bbox of image in page
+                bbox_cords = ocr_results[page_id]["bboxes"][bbox_id]
+
+                visual = Visual(document=pdf_document,
+                                document_page=page_number,
+                                bbox=bbox_cords, bbox_units="px")
+
+                if len(bbox_matches) == 0:  # if more than one bbox 
+                    # matches, skip and do text analysis
+                    pass
+                else:
+                    # get text from the OCR results of the page
+                    for match in bbox_matches:
+                        ocr_caption = text_strings[match]
+
+                        if ocr_caption:
+                            try:
+                                visual.set_caption(ocr_caption)
+                            except Warning:  # ignore warnings when caption
+                                # is already set.
+                                logger.warning("Caption already set for: %s",
+                                               BoundingBox(
+                                                   tuple(text_bboxes[match]),
+                                                   ocr_settings["ocr"]
+                                                   ["resolution"]).bbox())
+
+                visual.set_location(FilePath(root_path=output_dir,
+                                             file_path=visual_directory
+                                             + f'{page_id}-{bbox_id}.png'))
+
+                visuals.append(visual)
+
+    if image_saver is None:
         ocr.crop_images_to_bbox(ocr_results, image_directory)
-        del page_image  # free memory
+    else:
+        image_saver.save(ocr_results, image_directory)
+    del page_image  # free memory
 
-    return {'no_images_pages': no_image_pages, "metadata": metadata}
+    return visuals
+
+
+class _ImageSaver:
+    """Saves images of visuals found by OCR analysis in a thread, so images
+    are encoded and written while the next pages are analysed. PNG encoding
+    and file writes release the GIL. Used as a context manager, which waits
+    for all images to be saved and raises errors of saving them."""
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._saved = []
+
+    def save(self, ocr_results: dict, image_directory: str) -> None:
+        """Saves the images in OCR results, see ocr.crop_images_to_bbox()."""
+        self._saved.append(self._executor.submit(
+            ocr.crop_images_to_bbox, ocr_results, image_directory))
+
+    def __enter__(self) -> "_ImageSaver":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self._executor.shutdown(wait=True)
+        if exc_type is None:
+            for future in self._saved:
+                future.result()
+
+
+def _ocr_pages(page_numbers: list, pdf_document: Document, output_dir: str,
+               pdf_file_dir: str, image_directory: str, ocr_settings: dict,
+               logger: Logger, entry_id: str = None,
+               image_saver: _ImageSaver = None) -> list:
+    """Extracts visuals from consecutive pages of a PDF file using OCR
+    analysis. All pages are rasterized in a single call to poppler, and
+    analysed in a single call to Tesseract. See _ocr_page() for a
+    description of the other parameters. If no image_saver is given,
+    images are saved by a thread of its own before returning.
+
+    Parameters
+    ----------
+    page_numbers : list
+        Consecutive numbers of the pages in the PDF file, starting at 1.
+
+    Returns
+    -------
+    list
+        A list of Visual objects found in the pages, in page order.
+    """
+
+    page_images = ocr.convert_pdf_to_image(
+        pdf_document.location.full_path(),
+        dpi=ocr_settings["ocr"]["resolution"],
+        first_page=page_numbers[0],
+        last_page=page_numbers[-1],
+        )
+
+    page_numbers = page_numbers[:len(page_images)]
+    ocr_results = ocr.extract_bboxes_from_horc_pages(
+        page_images, page_numbers, config=ocr_settings["ocr"]["tesseract"],
+        entry_id=entry_id, resize=ocr_settings["ocr"]["resize"])
+
+    visuals = []
+    with contextlib.ExitStack() as stack:
+        if image_saver is None:
+            image_saver = stack.enter_context(_ImageSaver())
+        for page_number, page_image in zip(page_numbers, page_images):
+            # results of the page, with the same page id as in
+            # ocr.extract_bboxes_from_horc()
+            page_id = (f'{entry_id}-page-{page_number}'
+                       if entry_id is not None else f'page-{page_number}')
+            page_results = ({page_id: ocr_results[page_id]}
+                            if page_id in ocr_results else {})
+            visuals.extend(_ocr_page(page_number, pdf_document, output_dir,
+                                     pdf_file_dir, image_directory,
+                                     ocr_settings, logger, entry_id,
+                                     page_image=[page_image],
+                                     ocr_results=page_results,
+                                     image_saver=image_saver))
+    del page_images, ocr_results  # free memory
+
+    return visuals
+
+
+def _ocr_pages_worker(page_numbers: list, pdf_document: Document,
+                      output_dir: str, pdf_file_dir: str,
+                      image_directory: str, ocr_settings: dict,
+                      logger_name: str, log_file: str,
+                      entry_id: str = None) -> list:
+    """Runs _ocr_pages() in a worker process. See _ocr_pages() for a
+    description of the parameters."""
+
+    logger = _worker_logger(logger_name, log_file)
+
+    return _ocr_pages(page_numbers, pdf_document, output_dir, pdf_file_dir,
+                      image_directory, ocr_settings, logger, entry_id)
+
+
+def _batch_pages(page_numbers: list, batch_size: int) -> list:
+    """Groups page numbers into batches of consecutive pages with at most
+    batch_size pages.
+
+    Parameters
+    ----------
+    page_numbers : list
+        Numbers of pages, in the order they are processed.
+    batch_size : int
+        Maximum number of pages in a batch.
+
+    Returns
+    -------
+    list
+        A list of lists of consecutive page numbers.
+    """
+
+    batches = []
+    for page_number in page_numbers:
+        if (batches and len(batches[-1]) < batch_size
+                and batches[-1][-1] + 1 == page_number):
+            batches[-1].append(page_number)
+        else:
+            batches.append([page_number])
+
+    return batches
+
+
+def _queued_page_batches(first_page_number: int, page_queue: queue.Queue,
+                         batch_size: int) -> Iterator[list]:
+    """Groups pages read from a queue into batches of consecutive pages
+    with at most batch_size pages. A batch contains the next page in the
+    queue and the consecutive pages that are already waiting, so pages
+    are never held back to wait for the next page.
+
+    Parameters
+    ----------
+    first_page_number : int
+        Number of the first page, already read from the queue.
+    page_queue : queue.Queue
+        A queue of pages, as dictionaries with a 'page_number' key. The
+        queue ends with None.
+    batch_size : int
+        Maximum number of pages in a batch.
+
+    Yields
+    ------
+    list
+        Lists of consecutive page numbers.
+    """
+
+    batch = [first_page_number]
+    while True:
+        try:
+            page = page_queue.get_nowait()
+        except queue.Empty:  # no pages waiting, the batch is complete
+            yield batch
+            page = page_queue.get()  # waits for the next page
+            batch = []
+        if page is None:  # end of the queue
+            if batch:
+                yield batch
+            return
+        if batch and (len(batch) == batch_size
+                      or batch[-1] + 1 != page["page_number"]):
+            yield batch
+            batch = []
+        batch.append(page["page_number"])
 
 
 def find_pdf_files(directory: str, prefix: str = None) -> list:
@@ -626,25 +1161,122 @@ def find_pdf_files(directory: str, prefix: str = None) -> list:
     Returns
     -------
     list
-        List of paths to PDF files. Resulting path is a combination of the
-        directory path and the file name.
+        List of paths to PDF files. Resulting path is the directory path
+        joined with the file name.
+
+    Notes
+    -----
+    The PDF files of a directory are cached until the modification time,
+    inode or size of the directory changes. On file systems with coarse
+    timestamps (e.g., FAT or some network mounts), files added shortly
+    after a directory was scanned may be missed. Call
+    find_pdf_files.cache_clear() to scan directories again.
     """
 
-    pdf_files = []
-    for f in tqdm(os.listdir(directory), desc="Collecting PDF files",
-                  unit="files"):
-        if prefix:
-            if f.startswith(prefix) and f.endswith(".pdf"):
-                pdf_files.append(directory+f)
-        else:
-            if f.endswith(".pdf"):
-                pdf_files.append(directory+f)
+    if prefix is None:
+        prefix = ""  # every file name starts with an empty string
+
+    # the directory is scanned once, and again only if its content changes,
+    # so batch processing of many entries in a directory doesn't scan it
+    # once per entry
+    stat = os.stat(directory)
+    pdf_files = [os.path.join(directory, name)
+                 for name in _list_pdf_files(
+                     directory, (stat.st_mtime_ns, stat.st_ino, stat.st_size))
+                 if name.startswith(prefix)]
 
     print("Found PDF files: ", len(pdf_files))
 
     return pdf_files
 
 
+@lru_cache(maxsize=16)
+def _list_pdf_files(directory: str, version: tuple) -> tuple:
+    """Returns the names of PDF files in a directory. Results are cached by
+    directory path and version, the modification time, inode and size of
+    the directory. The modification time changes when files are added,
+    removed or renamed in the directory."""
+
+    pdf_files = []
+    # scandir returns file types with the directory entries, so no extra
+    # system calls are needed to skip directories
+    with os.scandir(directory) as entries:
+        for entry in tqdm(entries, desc="Collecting PDF files",
+                          unit="files"):
+            if entry.name.endswith(".pdf") and entry.is_file():
+                pdf_files.append(entry.name)
+
+    return tuple(pdf_files)
+
+
+find_pdf_files.cache_clear = _list_pdf_files.cache_clear
+
+
+def _pdf_file_dirs(pdf_files: list) -> dict:
+    """Returns the name of the output directory of each PDF file of an
+    entry, e.g., pdf-001 for the first PDF file. Names are numbered in the
+    order of pdf_files, so the same file always gets the same directory
+    within an entry."""
+
+    return {pdf: f'pdf-{counter:03d}'
+            for counter, pdf in enumerate(pdf_files, start=1)}
+
+
+def _entry_file(entry_directory: str, entry_id: str, suffix: str) -> str:
+    """Returns the path of an output file of an entry, named after the entry
+    id and a suffix, e.g., 00001-metadata.csv."""
+
+    return os.path.join(entry_directory, entry_id + suffix)
+
+
+def _log_file_handler(log_file: str) -> logging.FileHandler:
+    """Creates a file handler with the log message format used by
+    the pipelines."""
+
+    file_handler = logging.FileHandler(log_file)
+    # Create a formatter to specify the log message format
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s -\
+                                  %(message)s')
+    file_handler.setFormatter(formatter)
+
+    return file_handler
+
+
+def _log_file(logger: Logger) -> str:
+    """Returns the path of the first file handler of a logger, or None
+    if the logger doesn't log to a file."""
+
+    for handler in logger.handlers:
+        if isinstance(handler, logging.FileHandler):
+            return handler.baseFilename
+
+    return None
+
+
+def _process_pool(max_workers: int = None) -> ProcessPoolExecutor:
+    """Creates a pool of worker processes. Workers are started with the
+    spawn method instead of fork, the default on Linux. Forked workers
+    inherit locks held by other threads when the pool starts (e.g., OCR
+    threads, tqdm and logging handlers in the Layout+OCR pipeline), which
+    can deadlock them. Spawned workers start with fresh loggers, see
+    _worker_logger()."""
+
+    return ProcessPoolExecutor(max_workers=max_workers,
+                               mp_context=multiprocessing.get_context("spawn"))
+
+
+def _worker_logger(name: str, log_file: str = None) -> Logger:
+    """Gets a logger in a worker process. Loggers are not shared between
+    processes, so a file handler is added if the logger has none."""
+
+    logger = logging.getLogger(name)
+    if not logger.handlers and log_file is not None:
+        logger.setLevel(logging.INFO)
+        logger.addHandler(_log_file_handler(log_file))
+
+    return logger
+
+
 def start_logging(name: str, log_file: str, entry_id: str) -> Logger:
     """Starts logging to a file.
 
@@ -665,19 +1297,114 @@ def start_logging(name: str, log_file: str, entry_id: str) -> Logger:
     logger = logging.getLogger(name)
     # Set the logging level to INFO (or any other desired level)
     logger.setLevel(logging.INFO)
-    # Create a file handler to save log messages to a file
-    file_handler = logging.FileHandler(log_file)
-    # Create a formatter to specify the log message format
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s -\
-                                  %(message)s')
-    file_handler.setFormatter(formatter)
-    # Add the file handler to the logger
-    logger.addHandler(file_handler)
-    logger.info(f"Starting {name} pipeline for entry: " + entry_id)
+    # Loggers are global, so file handlers of a previous run (e.g., a
+    # previous entry in a batch) are closed. Otherwise, messages would also
+    # be written to the log files of previous runs
+    for handler in logger.handlers[:]:
+        if isinstance(handler, logging.FileHandler):
+            logger.removeHandler(handler)
+            handler.close()
+    # Add a file handler to save log messages to a file
+    logger.addHandler(_log_file_handler(log_file))
+    logger.info("Starting %s pipeline for entry: %s", name, entry_id)
 
     return logger
 
 
+def _extract_visuals_by_layout_worker(pdf: str, data_dir: str,
+                                      output_dir: str, pdf_file_dir: str,
+                                      layout_settings: dict, logger_name: str,
+                                      log_file: str, entry_id: str,
+                                      page_numbers: list = None,
+                                      use_cache: bool = False) -> dict:
+    """Runs extract_visuals_by_layout() on a PDF file, or on some of its
+    pages, in a worker process. Extracted visuals are collected in a new
+    Metadata object, which can be merged into the metadata of the entry.
+
+    Parameters
+    ----------
+    pdf : str
+        Path to the PDF file as returned by find_pdf_files().
+    data_dir : str
+        Path to the input directory containing the PDF file.
+    output_dir : str
+        Path to the output directory where visuals will be saved.
+    pdf_file_dir : str
+        Name of a directory where the results will be saved.
+    layout_settings : dict
+        A dictionary containing the settings for the layout analysis.
+    logger_name : str
+        Name of the logger of the pipeline.
+    log_file : str
+        Path to the log file of the entry.
+    entry_id : str
+        Identifier of the entry being processed.
+    page_numbers : list
+        Zero-indexed numbers of the pages to process. If None, all pages
+        in the PDF file are processed. Defaults to None.
+    use_cache : bool
+        If True, the sorted layout is cached. See
+        extract_visuals_by_layout(). Defaults to False.
+
+    Returns
+    -------
+    dict
+        A dictionary with the same keys as extract_visuals_by_layout().
+    """
+
+    logger = _worker_logger(logger_name, log_file)
+
+    return extract_visuals_by_layout(pdf, Metadata(), data_dir, output_dir,
+                                     pdf_file_dir, layout_settings, logger,
+                                     entry_id, page_numbers,
+                                     use_cache=use_cache)
+
+
+def _split_pdf_pages(pdf_files: list, workers: int) -> list:
+    """Splits PDF files into tasks for a pool of workers. The pages of
+    large PDF files are split into contiguous ranges, so that a large PDF
+    file is processed by several workers while small PDF files are
+    processed as a whole. Ranges are sized to give each worker about
+    LAYOUT_TASKS_PER_WORKER tasks, so that workers which finish early take
+    the remaining ones.
+
+    Parameters
+    ----------
+    pdf_files : list
+        List of paths to PDF files.
+    workers : int
+        Number of workers available.
+
+    Returns
+    -------
+    list
+        A list of (pdf_file, page_numbers) tuples in the order of
+        pdf_files. page_numbers is None when the whole PDF file is a task.
+    """
+
+    page_counts = []
+    for pdf in pdf_files:
+        try:
+            page_counts.append(count_pdf_pages(pdf))
+        except Exception:  # errors are reported by layout analysis
+            page_counts.append(0)
+
+    range_size = max(1, -(-sum(page_counts)  # ceil division
+                          // (workers * LAYOUT_TASKS_PER_WORKER)))
+    tasks = []
+    for pdf, total_pages in zip(pdf_files, page_counts):
+        if total_pages <= range_size:
+            tasks.append((pdf, None))
+            continue
+        # ranges of the same PDF file are kept about the same size
+        size = -(-total_pages // -(-total_pages // range_size))
+        for start in range(0, total_pages, size):
+            tasks.append((pdf, list(range(start, min(start + size,
+                                                     total_pages)))))
+
+    return tasks
+
+
 def manage_input_files(pdf_files: list, destination_dir: str,
                        mods_file: str = None) -> None:
     """copy MODS and PDF files to a directory.
@@ -697,20 +1424,29 @@ def manage_input_files(pdf_files: list, destination_dir: str,
 
     """
 
+    files = list(pdf_files)
     if mods_file:
-        mods_file_name = pathlib.Path().stem + ".xml"
-        if not os.path.exists(os.path.join(destination_dir, mods_file_name)):
-            shutil.copy2(mods_file, destination_dir)
+        files.append(mods_file)
 
-    if len(pdf_files) > 0:
-        for pdf in pdf_files:
-            if not os.path.exists(os.path.join(destination_dir,
-                                  os.path.basename(pdf))):
-                shutil.copy2(pdf, destination_dir)
+    if len(files) > 0:
+        # copying is I/O bound, so files are copied concurrently
+        with ThreadPoolExecutor(
+                max_workers=min(MAX_COPY_WORKERS, len(files))) as executor:
+            list(executor.map(_copy_if_missing, files,
+                              itertools.repeat(destination_dir)))
 
     return None
 
 
+def _copy_if_missing(file: str, destination_dir: str) -> None:
+    """Copies a file to a directory, unless a file with the same name
+    already exists in it."""
+
+    if not os.path.exists(os.path.join(destination_dir,
+                                       os.path.basename(file))):
+        shutil.copy2(file, destination_dir)
+
+
 class Layout(Pipeline):
     """A pipeline for extracting metadata and visuals from PDF
       files using a layout analysis. Layout analysis recursively
@@ -765,11 +1501,8 @@ class Layout(Pipeline):
         entry_directory = create_output_dir(OUTPUT_DIR, entry_id)
 
         # start logging
-        logger = start_logging('layout',
-                               os.path.join(entry_directory,
-                                            entry_id + '.log'),
-                               entry_id)
-
+        log_file = _entry_file(entry_directory, entry_id, '.log')
+        logger = start_logging('layout', log_file, entry_id)
 
         # set web url. This is not part of the MODS file
         base_url = "http://resolver.tudelft.nl/"
@@ -777,34 +1510,71 @@ class Layout(Pipeline):
 
         # FIND PDF FILES in data directory
         PDF_FILES = find_pdf_files(DATA_DIR, prefix=search_prefix)
-        logger.info("PDF files in entry: " + str(len(PDF_FILES)))
+        logger.info("PDF files in entry: %s", len(PDF_FILES))
 
         # PROCESS PDF FILES
-        pdf_document_counter = 1
+        # PDF files, or page ranges of large PDF files, are processed
+        # independently, and their metadata is merged into the entry in
+        # the order of PDF_FILES
+        pdf_file_dirs = _pdf_file_dirs(PDF_FILES)
+        workers = self.max_workers or 1
+        tasks = _split_pdf_pages(PDF_FILES, workers) if workers > 1 else []
         results = {}
-        for pdf in PDF_FILES:
-
-            print("--> Processing file:", pdf)
-            pdf_file_dir = 'pdf-' + str(pdf_document_counter).zfill(3)
-
-            results = extract_visuals_by_layout(pdf, meta_entry, DATA_DIR,
-                                                OUTPUT_DIR, pdf_file_dir,
-                                                self.settings, logger,
-                                                entry_id,
-                                                )
-
-            pdf_document_counter += 1
+        if len(tasks) <= 1:
+            for pdf in PDF_FILES:
+                print("--> Processing file:", pdf)
+                results = extract_visuals_by_layout(pdf, meta_entry, DATA_DIR,
+                                                    OUTPUT_DIR,
+                                                    pdf_file_dirs[pdf],
+                                                    self.settings, logger,
+                                                    entry_id,
+                                                    use_cache=self.cache_layout
+                                                    )
+        else:
+            with _process_pool(workers) as executor:
+                futures = [executor.submit(_extract_visuals_by_layout_worker,
+                                           pdf, DATA_DIR, OUTPUT_DIR,
+                                           pdf_file_dirs[pdf], self.settings,
+                                           'layout', log_file, entry_id,
+                                           page_numbers, self.cache_layout)
+                           for pdf, page_numbers in tasks]
+                # document of each PDF file, as merged from its first task
+                pdf_documents = {}
+                for (pdf, page_numbers), future in zip(tasks, futures):
+                    # errors of pdfminer are caught by the worker. Those
+                    # raised outside its checks skip the task, but not the
+                    # remaining pages and PDF files of the entry. Other
+                    # errors, e.g., a broken pool, stop the run
+                    try:
+                        task_results = future.result()
+                    except PSException as e:
+                        logger.error("Layout analysis failed for: %s pages: %s %r",
+                                     pdf, page_numbers, e)
+                        continue
+                    if pdf not in pdf_documents:  # first task of a PDF file
+                        print("--> Processing file:", pdf)
+                        meta_entry.merge(task_results['metadata'])
+                        results = {'no_images_pages': []}
+                        pdf_documents[pdf] = \
+                            task_results['metadata'].documents[0]
+                    else:  # the document was added by the first task
+                        for visual in task_results['metadata'].visuals or []:
+                            # same object as in the metadata, not the copy
+                            # sent by the worker
+                            visual.document = pdf_documents[pdf]
+                            meta_entry.add_visual(visual)
+                    results['no_images_pages'].extend(
+                        task_results['no_images_pages'])
+            results['metadata'] = meta_entry
 
         end_time = time.time()
         processing_time = end_time - start_time
-        logger.info("Processing time: " + str(processing_time) + " seconds")
-        logger.info("Extracted visuals: " + str(meta_entry.total_visuals))
+        logger.info("Processing time: %s seconds", processing_time)
+        logger.info("Extracted visuals: %s", meta_entry.total_visuals)
 
         # SAVE METADATA TO files
-        csv_file = str(os.path.join(entry_directory, entry_id)
-                       + "-metadata.csv")
-        json_file = str(os.path.join(entry_directory, entry_id)
-                        + "-metadata.json")
+        csv_file = _entry_file(entry_directory, entry_id, "-metadata.csv")
+        json_file = _entry_file(entry_directory, entry_id, "-metadata.json")
         meta_entry.save_to_csv(csv_file)
         meta_entry.save_to_json(json_file)
 
@@ -812,8 +1582,8 @@ class Layout(Pipeline):
             logger.warning("No identifier found in MODS file")
 
         # SAVE settings to json file
-        settings_file = str(os.path.join(entry_directory, entry_id)
-                            + "-settings.json")
+        settings_file = _entry_file(entry_directory, entry_id,
+                                    "-settings.json")
         with open(settings_file, 'w') as f:
             json.dump(self.settings, f, indent=4)
 
@@ -825,7 +1595,8 @@ class Layout(Pipeline):
             temp_entry_directory = create_output_dir(
                 os.path.join(TMP_DIR, entry_id)
             )
-            logger.info("Managing file and copying to: " + str(temp_entry_directory))
+            logger.info("Managing file and copying to: %s",
+                        temp_entry_directory)
             manage_input_files(PDF_FILES, temp_entry_directory, MODS_FILE)
             logger.info("Done managing files")
 
@@ -888,45 +1659,61 @@ class OCR(Pipeline):
 
         # start logging
         logger = start_logging('OCR',
-                               os.path.join(entry_directory,
-                                            entry_id + '.log'),
+                               _entry_file(entry_directory, entry_id,
+                                           '.log'),
                                entry_id)
 
-
         # set web url. This is not part of the MODS file
         base_url = "http://resolver.tudelft.nl/"
         meta_entry.add_web_url(base_url)
         # FIND PDF FILES in data directory
         PDF_FILES = find_pdf_files(DATA_DIR, prefix=search_prefix)
-        logger.info("PDF files in entry: " + str(len(PDF_FILES)))
+        logger.info("PDF files in entry: %s", len(PDF_FILES))
 
         # PROCESS PDF FILES
-        pdf_document_counter = 1
+        pdf_file_dirs = _pdf_file_dirs(PDF_FILES)
+        workers = self.max_workers or 1
         results = {}
-        for pdf in PDF_FILES:
-
-            print("--> Processing file:", pdf)
-            pdf_file_dir = 'pdf-' + str(pdf_document_counter).zfill(3)
-
-            results = extract_visuals_by_ocr(meta_entry, DATA_DIR,
-                                             OUTPUT_DIR, pdf_file_dir,
-                                             logger,
-                                             entry_id, self.settings,
-                                             pdf=pdf
-                                             )
-
-            pdf_document_counter += 1
+        if workers == 1 or len(PDF_FILES) <= 1:
+            for pdf in PDF_FILES:
+                print("--> Processing file:", pdf)
+                results = extract_visuals_by_ocr(meta_entry, DATA_DIR,
+                                                 OUTPUT_DIR,
+                                                 pdf_file_dirs[pdf],
+                                                 logger,
+                                                 entry_id, self.settings,
+                                                 pdf=pdf,
+                                                 max_workers=self.max_workers
+                                                 )
+        else:
+            # PDF files are analysed at the same time, and their pages share
+            # one pool of processes, so workers don't wait for the last
+            # pages of a PDF file. Metadata of each PDF file is merged into
+            # the entry in the order of PDF_FILES
+            with _process_pool(workers) as executor, \
+                    ThreadPoolExecutor(max_workers=min(
+                        workers, len(PDF_FILES))) as threads:
+                futures = [threads.submit(extract_visuals_by_ocr, Metadata(),
+                                          DATA_DIR, OUTPUT_DIR,
+                                          pdf_file_dirs[pdf], logger,
+                                          entry_id, self.settings, pdf=pdf,
+                                          max_workers=workers,
+                                          executor=executor)
+                           for pdf in PDF_FILES]
+                for pdf, future in zip(PDF_FILES, futures):
+                    print("--> Processing file:", pdf)
+                    results = future.result()
+                    meta_entry.merge(results["metadata"])
+            results["metadata"] = meta_entry
 
         end_time = time.time()
         processing_time = end_time - start_time
-        logger.info("Processing time: " + str(processing_time) + " seconds")
-        logger.info("Extracted visuals: " + str(meta_entry.total_visuals))
+        logger.info("Processing time: %s seconds", processing_time)
+        logger.info("Extracted visuals: %s", meta_entry.total_visuals)
 
         # SAVE METADATA TO files
-        csv_file = str(os.path.join(entry_directory, entry_id)
-                       + "-metadata.csv")
-        json_file = str(os.path.join(entry_directory, entry_id)
-                        + "-metadata.json")
+        csv_file = _entry_file(entry_directory, entry_id, "-metadata.csv")
+        json_file = _entry_file(entry_directory, entry_id, "-metadata.json")
         meta_entry.save_to_csv(csv_file)
         meta_entry.save_to_json(json_file)
 
@@ -934,8 +1721,8 @@ class OCR(Pipeline):
             logger.warning("No identifier found in MODS file")
 
         # SAVE settings to json file
-        settings_file = str(os.path.join(entry_directory, entry_id)
-                            + "-settings.json")
+        settings_file = _entry_file(entry_directory, entry_id,
+                                    "-settings.json")
         with open(settings_file, 'w') as f:
             json.dump(self.settings, f, indent=4)
 
@@ -947,7 +1734,8 @@ class OCR(Pipeline):
             temp_entry_directory = create_output_dir(
                 os.path.join(TMP_DIR, entry_id)
             )
-            logger.info("Managing file and copying to: " + str(temp_entry_directory))
+            logger.info("Managing file and copying to: %s",
+                        temp_entry_directory)
             manage_input_files(PDF_FILES, temp_entry_directory, MODS_FILE)
             logger.info("Done managing files")
         
@@ -1017,51 +1805,74 @@ class LayoutOCR(Pipeline):
 
         # start logging
         logger = start_logging('layout+OCR',
-                               os.path.join(entry_directory,
-                                            entry_id + '.log'),
+                               _entry_file(entry_directory, entry_id,
+                                           '.log'),
                                entry_id)
 
-
         # set web url. This is not part of the MODS file
         base_url = "http://resolver.tudelft.nl/"
         meta_entry.add_web_url(base_url)
 
         # FIND PDF FILES in data directory
         PDF_FILES = find_pdf_files(DATA_DIR, prefix=search_prefix)
-        logger.info("PDF files in entry: " + str(len(PDF_FILES)))
+        logger.info("PDF files in entry: %s", len(PDF_FILES))
 
         # PROCESS PDF FILES
-        pdf_document_counter = 1
+        pdf_file_dirs = _pdf_file_dirs(PDF_FILES)
+        workers = self.max_workers or 1
         results = {}
-        for pdf in PDF_FILES:
-
-            print("--> Processing file:", pdf)
-            pdf_file_dir = 'pdf-' + str(pdf_document_counter).zfill(3)
-
-            # Step 1: Layout analysis
-            layout_results = extract_visuals_by_layout(
-                pdf, meta_entry, DATA_DIR, OUTPUT_DIR, pdf_file_dir,
-                self.settings, logger, entry_id)
-            
-            # Step 2: OCR analysis on pages where no images were found
-            # by step 1.
-            results = extract_visuals_by_ocr(
-                meta_entry, DATA_DIR, OUTPUT_DIR, pdf_file_dir,
-                logger, entry_id, self.settings,
-                lt_pages=layout_results["no_images_pages"])
-
-            pdf_document_counter += 1
+        # Step 1: Layout analysis
+        # Step 2: OCR analysis on pages where no images were found
+        # by step 1.
+        # Both steps run at the same time. Layout analysis puts pages
+        # without images in a queue, which OCR analysis consumes in a
+        # separate thread. Layout analysis of the next PDF file starts
+        # while OCR analysis of previous PDF files continues, and OCR pages
+        # of all PDF files share one pool of processes. Layout and OCR
+        # results are kept apart and merged in the order of PDF_FILES, so
+        # the order of visuals doesn't change.
+        pdf_results = []  # layout metadata and OCR future of each PDF file
+        with contextlib.ExitStack() as stack:
+            executor = stack.enter_context(
+                _process_pool(workers)) if workers > 1 else None
+            threads = stack.enter_context(ThreadPoolExecutor(
+                max_workers=workers))
+            for pdf in PDF_FILES:
+
+                print("--> Processing file:", pdf)
+                no_images_queue = queue.Queue()
+                layout_metadata = Metadata()
+                ocr_future = threads.submit(
+                    extract_visuals_by_ocr,
+                    Metadata(), DATA_DIR, OUTPUT_DIR, pdf_file_dirs[pdf],
+                    logger, entry_id, self.settings, pdf=pdf,
+                    lt_pages=no_images_queue,
+                    max_workers=self.max_workers, executor=executor)
+                try:
+                    extract_visuals_by_layout(
+                        pdf, layout_metadata, DATA_DIR, OUTPUT_DIR,
+                        pdf_file_dirs[pdf], self.settings, logger, entry_id,
+                        no_images_queue=no_images_queue,
+                        use_cache=self.cache_layout)
+                finally:
+                    no_images_queue.put(None)  # no more pages
+                pdf_results.append((layout_metadata, ocr_future))
+
+            for layout_metadata, ocr_future in pdf_results:
+                results = ocr_future.result()
+                meta_entry.merge(layout_metadata)
+                meta_entry.merge(results["metadata"])
+        if pdf_results:
+            results["metadata"] = meta_entry
 
         end_time = time.time()
         processing_time = end_time - start_time
-        logger.info("Processing time: " + str(processing_time) + " seconds")
-        logger.info("Extracted visuals: " + str(meta_entry.total_visuals))
+        logger.info("Processing time: %s seconds", processing_time)
+        logger.info("Extracted visuals: %s", meta_entry.total_visuals)
 
         # SAVE METADATA TO files
-        csv_file = str(os.path.join(entry_directory, entry_id)
-                       + "-metadata.csv")
-        json_file = str(os.path.join(entry_directory, entry_id)
-                        + "-metadata.json")
+        csv_file = _entry_file(entry_directory, entry_id, "-metadata.csv")
+        json_file = _entry_file(entry_directory, entry_id, "-metadata.json")
         meta_entry.save_to_csv(csv_file)
         meta_entry.save_to_json(json_file)
 
@@ -1069,8 +1880,8 @@ class LayoutOCR(Pipeline):
             logger.warning("No identifier found in MODS file")
 
         # SAVE settings to json file
-        settings_file = str(os.path.join(entry_directory, entry_id)
-                            + "-settings.json")
+        settings_file = _entry_file(entry_directory, entry_id,
+                                    "-settings.json")
         with open(settings_file, 'w') as f:
             json.dump(self.settings, f, indent=4)
 
@@ -1082,7 +1893,8 @@ class LayoutOCR(Pipeline):
             temp_entry_directory = create_output_dir(
                 os.path.join(TMP_DIR, entry_id)
             )
-            logger.info("Managing file and copying to: " + str(temp_entry_directory))
+            logger.info("Managing file and copying to: %s",
+                        temp_entry_directory)
             manage_input_files(PDF_FILES, temp_entry_directory, MODS_FILE)
             logger.info("Done managing files")
 
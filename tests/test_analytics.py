@@ -5,6 +5,7 @@ Pytest will automatically run all functions that start with test_ in this file.
 
 
 from visarchpy import analytics
+import matplotlib.pyplot as plt
 import pytest
 import os
 
@@ -36,4 +37,42 @@ class TestGetImagePaths:
         print(result)
         assert result == [os.path.join(image_directory, file) for file in os.listdir(image_directory) if file.endswith('.jpg')]
 
+    def test_with_uppercase_extensions(self, image_directory):
+        """Test get_image_paths matches extensions case-insensitively"""
+        result = analytics.get_image_paths(image_directory, extensions=['.JPG'])
 
+        assert result == analytics.get_image_paths(image_directory, extensions=['.jpg'])
+        assert len(result) == 1
+
+    def test_iter_image_paths(self, image_directory):
+        """Test iter_image_paths yields the same paths as get_image_paths"""
+        result = analytics.iter_image_paths(image_directory)
+
+        assert not isinstance(result, list)
+        assert list(result) == analytics.get_image_paths(image_directory)
+
+
+class TestPlotBboxes:
+    """Test class for plot_bboxes"""
+
+    def test_save_without_show(self, image_directory, tmp_path):
+        """Test plot is saved off-screen when show is False"""
+        images = analytics.get_image_paths(image_directory, extensions=['.jpg'])
+        plot_file = tmp_path / 'bbox-plot.png'
+
+        analytics.plot_bboxes(images, show=False, resolution=50,
+                              save_to_file=str(plot_file))
+
+        assert plot_file.is_file()
+        assert plt.get_fignums() == []  # no pyplot figure is created
+
+    @pytest.mark.parametrize("size", [(5, 40), (40, 5), (1, 1)])
+    def test_read_image_bbox_tiny_jpeg(self, tmp_path, size):
+        """Test bounding boxes of JPEG images smaller than 8 pixels on a
+        side are read without errors"""
+        from PIL import Image
+
+        image_file = tmp_path / 'tiny.jpg'
+        Image.new('RGB', size, (255, 255, 255)).save(image_file)
+
+        assert analytics._read_image_bbox(str(image_file)) == (0, 0) + size
@@ -2,6 +2,8 @@
 Units tests for captions.py
 Pytest will automatically run all functions that start with test_ in this file.
 """
+import dataclasses
+import numpy as np
 from visarchpy import captions
 import pytest
 
@@ -52,3 +54,77 @@ class TestBoundingBox:
     def test_bbox(self, bbox_):
         """Test BoundingBox bbox method has the correct number of coordinates"""
         assert len(bbox_.bbox()) == 4
+
+
+def test_offset_is_immutable():
+    """Test offsets can't be modified, so they can be shared"""
+
+    offset = captions.Offset(10, "mm")
+
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        offset.distance = 20
+    assert offset == captions.Offset(10, "mm")
+    assert hash(offset) == hash(captions.Offset(10, "mm"))
+
+
+@pytest.mark.parametrize("direction", ["right", "left", "down", "up", "all"])
+def test_find_captions_by_distance(direction):
+    """Test find_captions_by_distance matches find_caption_by_distance
+    for every pair of image and text bounding boxes"""
+
+    offset = captions.Offset(10, "mm")
+    images = [captions.BoundingBox((50, 50, 100, 100), "pt"),
+              captions.BoundingBox((300, 300, 400, 350), "pt")]
+    texts = [captions.BoundingBox((x, y, x + 40, y + 10), "pt")
+             for x in range(0, 450, 30) for y in range(0, 450, 30)]
+    # a text box entirely inside an image is not in the search area
+    texts.append(captions.BoundingBox((320, 310, 380, 320), "pt"))
+
+    expected = [[text for text in texts
+                 if captions.find_caption_by_distance(image, text, offset,
+                                                      direction)]
+                for image in images]
+
+    assert captions.find_captions_by_distance(images, texts, offset,
+                                              direction) == expected
+    assert captions.find_captions_by_distance(images, [], offset,
+                                              direction) == [[], []]
+
+
+@pytest.mark.parametrize("direction", ["right", "left", "down", "up", "all"])
+def test_find_caption_indices_by_distance(direction):
+    """Test find_caption_indices_by_distance matches
+    find_captions_by_distance for bounding boxes in pixels"""
+
+    offset = captions.Offset(50, "px")
+    image_coords = [(50, 50, 300, 300), (600, 900, 1000, 1100)]
+    text_coords = [(x, y, x + 150, y + 40)
+                   for x in range(0, 1200, 90) for y in range(0, 1200, 90)]
+    texts = [captions.BoundingBox(coords, 250) for coords in text_coords]
+
+    expected = captions.find_captions_by_distance(
+        [captions.BoundingBox(coords, 250) for coords in image_coords],
+        texts, offset, direction)
+    results = captions.find_caption_indices_by_distance(
+        np.array(image_coords), np.array(text_coords), offset, direction,
+        pixels=True)
+
+    assert [[texts[index] for index in indices]
+            for indices in results] == expected
+    assert captions.find_caption_indices_by_distance(
+        np.empty((0, 4)), np.array(text_coords), offset, direction) == []
+
+
+def test_find_caption_by_text_keywords():
+    """Test find_caption_by_text validates keywords"""
+
+    with pytest.raises(ValueError):
+        captions.find_caption_by_text(None, keywords=[])
+
+    with pytest.raises(TypeError):
+        captions.find_caption_by_text(None, keywords=['figure', 1])
+
+    with pytest.raises(TypeError, match="Keyword must be of type string"):
+        captions.find_caption_by_text(None, keywords=[['figure']])
+
+    assert captions.find_caption_by_text(None, keywords=['figure']) is False
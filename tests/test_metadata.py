@@ -4,8 +4,10 @@ Test for metadata pakcage
 
 import pytest
 import os
+import json
 import visarchpy.metadata as metadata
 import warnings
+from dataclasses import dataclass, asdict
 
 @pytest.fixture(scope="module")
 def root_path():
@@ -77,3 +79,114 @@ class TestDocumentClass:
         assert doc.location.full_path() == str(os.path.join(root_path, file_path))
    
 
+
+
+class TestMetadataClass:
+    """tests for the Metadata class"""
+
+    def test_merge(self, root_path, file_path):
+        """
+        test documents and visuals of another metadata object are added
+        """
+        doc = metadata.Document(metadata.FilePath(root_path, file_path))
+        partial = metadata.Metadata()
+        partial.add_document(doc)
+        partial.add_visual(metadata.Visual(doc, 1, [0, 0, 10, 10], 'pt'))
+
+        entry = metadata.Metadata()
+        entry.merge(partial)
+        entry.merge(metadata.Metadata())  # empty metadata adds nothing
+
+        assert entry.documents == [doc]
+        assert entry.visuals == partial.visuals
+        assert entry.total_visuals == 1
+
+    def test_merge_type_error(self):
+        """
+        test merge only accepts Metadata objects
+        """
+        with pytest.raises(TypeError):
+            metadata.Metadata().merge({})
+
+    @pytest.mark.parametrize("total_visuals", [None, 0, 2])
+    def test_save_to_json(self, root_path, file_path, tmp_path,
+                          total_visuals):
+        """
+        test visuals written one at a time give the same JSON file as
+        writing the whole metadata at once
+        """
+        doc = metadata.Document(metadata.FilePath(root_path, file_path))
+        entry = metadata.Metadata()
+        entry.add_document(doc)
+        if total_visuals is not None:
+            entry.visuals = []
+            for page in range(total_visuals):
+                visual = metadata.Visual(doc, page, [0, 0, 10, 10], 'pt')
+                visual.set_caption('Figure "1"\n caption')
+                entry.add_visual(visual)
+
+        json_file = tmp_path / "metadata.json"
+        entry.save_to_json(str(json_file))
+
+        assert json_file.read_text() == json.dumps(entry.as_dict(), indent=4)
+        assert os.listdir(tmp_path) == ["metadata.json"]  # no temporary file
+
+    def test_save_to_json_loads(self, root_path, file_path, tmp_path):
+        """
+        test the JSON file loads as the metadata, also when visuals is not
+        the last field
+        """
+        @dataclass
+        class Entry(metadata.Metadata):
+            notes: list = None
+
+        doc = metadata.Document(metadata.FilePath(root_path, file_path))
+        entry = Entry(notes=["first", {"second": 2}])
+        entry.add_document(doc)
+        entry.add_visual(metadata.Visual(doc, 1, [0, 0, 10, 10], 'pt'))
+
+        json_file = tmp_path / "metadata.json"
+        entry.save_to_json(str(json_file))
+
+        with open(json_file) as f:
+            assert json.load(f) == asdict(entry)
+
+    @pytest.mark.parametrize("total_visuals", [None, 2])
+    def test_save_to_csv(self, root_path, file_path, tmp_path,
+                         total_visuals):
+        """
+        test the CSV file is the same as the one written by pandas
+        """
+        doc = metadata.Document(metadata.FilePath(root_path, file_path))
+        entry = metadata.Metadata()
+        entry.add_document(doc)
+        for page in range(total_visuals or 0):
+            visual = metadata.Visual(doc, page, [0, 0, 10.5, 10], 'pt')
+            visual.set_caption('Figure "1",\n caption')
+            entry.add_visual(visual)
+
+        csv_file = tmp_path / "metadata.csv"
+        entry.save_to_csv(str(csv_file))
+
+        assert csv_file.read_text() == entry.as_dataframe().to_csv(
+            index=False)
+
+
+def test_extract_mods_metadata_is_cached(tmp_path):
+    """Test MODS files are parsed once, and again after they change"""
+
+    mods_file = tmp_path / "sample-mods.xml"
+    mods_file.write_bytes(open("tests/data/sample-mods.xml", "rb").read())
+
+    results_1 = metadata.extract_mods_metadata(str(mods_file))
+    results_1["title"] = "modified"
+    results_2 = metadata.extract_mods_metadata(str(mods_file))
+
+    assert results_2["title"] != "modified"  # cache is not modified
+    assert metadata._cached_mods_metadata.cache_info().hits >= 1
+
+    # a newer modification time invalidates the cache
+    os.utime(mods_file, (0, os.path.getmtime(mods_file) + 10))
+    misses = metadata._cached_mods_metadata.cache_info().misses
+    metadata.extract_mods_metadata(str(mods_file))
+    assert metadata._cached_mods_metadata.cache_info().misses == misses + 1
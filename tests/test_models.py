@@ -0,0 +1,16 @@
+"""
+Units tests for models/__init__.py
+Pytest will automatically run all functions that start with test_ in this file.
+"""
+
+from visarchpy.models import KmeansBbox20
+
+
+def test_kmeans_bbox20_is_cached():
+    """Test the pickled model is loaded only once"""
+
+    predictor_1 = KmeansBbox20()()
+    predictor_2 = KmeansBbox20()()
+
+    assert predictor_1 is predictor_2
+    assert predictor_1.cluster_centers_.shape == (20, 2)
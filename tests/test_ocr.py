@@ -37,6 +37,58 @@ def test_filter_bbox_contained(boxes_inside_boxes):
     assert ocr.filter_bbox_contained(boxes_inside_boxes) == results
     
 
+def test_filter_bbox_contained_index(boxes_inside_boxes, monkeypatch):
+    """
+    test the spatial index used for many boxes gives the same results
+    """
+    import random
+
+    rng = random.Random(0)
+    boxes = dict(boxes_inside_boxes)
+    for i in range(200):
+        x, y = rng.randint(0, 1000), rng.randint(0, 1000)
+        boxes[f'rand{i}'] = [x, y, x + rng.randint(0, 300),
+                             y + rng.randint(0, 300)]
+    expected = ocr.filter_bbox_contained(boxes)
+
+    monkeypatch.setattr(ocr, 'CONTAINED_INDEX_MIN_BOXES', 0)
+
+    assert ocr.filter_bbox_contained(boxes) == expected
+    assert ocr.filter_bbox_contained(boxes_inside_boxes) == {
+        'id1': [0, 0, 100, 100], 'id2': [200, 300, 350, 400],
+        'id7': [1000, 1000, 1200, 1200], 'id3': [10, 20, 90, 90],
+        'id6': [10, 10, 15, 20]}
+
+
+def test_filter_bboxes(boxes_inside_boxes):
+    """
+    test filtering by size and containment at once gives the same results
+    as filtering by size and then by containment
+    """
+    import random
+
+    rng = random.Random(1)
+    boxes = dict(boxes_inside_boxes)
+    for i in range(100):
+        x, y = rng.randint(0, 1000), rng.randint(0, 1000)
+        boxes[f'rand{i}'] = [x, y, x + rng.randint(0, 300),
+                             y + rng.randint(1, 300)]
+    boxes['copy'] = list(boxes['rand0'])
+    boxes['long'] = [0, 0, 500, 10]
+
+    expected = ocr.filter_bbox_contained(ocr.filter_bbox_by_size(
+        boxes, min_width=20, min_height=20,
+        aspect_ratio=[(20/1, ">"), (1/20, "<")]))
+
+    assert ocr.filter_bboxes(boxes, min_width=20, min_height=20,
+                             max_aspect_ratio=20/1,
+                             min_aspect_ratio=1/20) == expected
+    assert list(ocr.filter_bboxes(boxes, min_width=20, min_height=20,
+                                  max_aspect_ratio=20/1,
+                                  min_aspect_ratio=1/20)) == list(expected)
+    assert ocr.filter_bboxes({}, min_width=20) == {}
+
+
 def test_filter_bbox_contained_unique(boxes_inside_boxes):
     """
     test if filter_bbox_contained returns only unique bounding boxes
@@ -54,3 +106,86 @@ def test_filter_bbox_contained_overlaps(overlaping_boxes):
     """
 
     assert ocr.filter_bbox_contained(overlaping_boxes) == overlaping_boxes
+
+
+def test_extract_bboxes_from_horc_texts(monkeypatch):
+    """
+    test text of text regions is returned along with their bounding boxes
+    """
+    from PIL import Image
+
+    hocr = ("<p class='ocr_par' id='par_1' title='bbox 0 0 100 100'>"
+            "<span class='ocrx_word'> </span></p>"
+            "<p class='ocr_par' id='par_2' title='bbox 0 110 100 120'>"
+            "<span class='ocrx_word'>Figure</span>"
+            "<span class='ocrx_word'>1:</span></p>")
+    monkeypatch.setattr(ocr.pytesseract, 'image_to_pdf_or_hocr',
+                        lambda *args, **kwargs: hocr.encode())
+
+    results = ocr.extract_bboxes_from_horc([Image.new('RGB', (100, 200))],
+                                           page_number=1)
+
+    assert results['page-1']['bboxes'] == {'par_1': [0, 0, 100, 100]}
+    assert results['page-1']['text_bboxes'] == {'par_2': [0, 110, 100, 120]}
+    assert results['page-1']['texts'] == {'par_2': 'Figure 1:'}
+
+
+def test_extract_bboxes_from_horc_pages(monkeypatch):
+    """
+    test pages are analysed in one call to Tesseract, and results have the
+    same ids as when each page is analysed alone
+    """
+    from PIL import Image
+
+    calls = []
+
+    def image_to_pdf_or_hocr(image, *args, **kwargs):
+        calls.append(Image.open(image).n_frames)
+        return ("<div class='ocr_page' id='page_1'>"
+                "<p class='ocr_par' id='par_1_1' title='bbox 0 0 100 100'>"
+                "<span class='ocrx_word'> </span></p></div>"
+                "<div class='ocr_page' id='page_2'></div>"
+                "<div class='ocr_page' id='page_3'>"
+                "<p class='ocr_par' id='par_3_1' title='bbox 0 110 100 120'>"
+                "<span class='ocrx_word'>Figure</span></p></div>").encode()
+    monkeypatch.setattr(ocr.pytesseract, 'image_to_pdf_or_hocr',
+                        image_to_pdf_or_hocr)
+
+    images = [Image.new('RGB', (100, 200)) for _ in range(3)]
+    results = ocr.extract_bboxes_from_horc_pages(images, [4, 5, 6])
+
+    assert calls == [3]
+    assert list(results) == ['page-4', 'page-6']  # page 5 has no results
+    assert results['page-4']['bboxes'] == {'par_1_1': [0, 0, 100, 100]}
+    assert results['page-6']['texts'] == {'par_1_1': 'Figure'}
+    assert results['page-6']['img'] is images[2]
+
+
+def test_filter_bbox_by_size(overlaping_boxes):
+    """
+    test boxes are filtered by minimum size and by aspect ratio
+    """
+
+    assert ocr.filter_bbox_by_size(overlaping_boxes, min_width=150,
+                                   min_height=150) == {
+        'id2': [50, 200, 350, 400], 'id7': [1000, 1000, 1200, 1200]}
+    assert ocr.filter_bbox_by_size(overlaping_boxes,
+                                   aspect_ratio=(1, '>')) == {
+        'id1': [0, 0, 100, 210], 'id7': [1000, 1000, 1200, 1200]}
+    assert ocr.filter_bbox_by_size(overlaping_boxes,
+                                   aspect_ratio=(1, '<')) == {
+        'id2': [50, 200, 350, 400], 'id7': [1000, 1000, 1200, 1200]}
+    assert ocr.filter_bbox_by_size({}, min_width=150) == {}
+
+    # several filters in one call give the same results as one at a time
+    boxes = {f'id{i}': [0, 0, width, height] for i, (width, height)
+             in enumerate([(10, 300), (300, 10), (100, 120), (30, 2000),
+                           (2000, 40), (0, 0), (80, 60)])}
+    expected = ocr.filter_bbox_by_size(boxes, min_width=50, min_height=50)
+    expected = ocr.filter_bbox_by_size(expected, aspect_ratio=(20, '>'))
+    expected = ocr.filter_bbox_by_size(expected, aspect_ratio=(1/20, '<'))
+    assert ocr.filter_bbox_by_size(
+        boxes, min_width=50, min_height=50,
+        aspect_ratio=[(20, '>'), (1/20, '<')]) == expected
+    with pytest.raises(ValueError):
+        ocr.filter_bbox_by_size(boxes, aspect_ratio=[(20, '>'), (1, '=')])
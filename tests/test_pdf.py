@@ -24,3 +24,71 @@ def test_extract_pages():
     assert "texts" in results
     assert "images" in results
     assert "vectors" in results
+
+
+def test_count_pdf_pages():
+    """
+    Test count_pdf_pages function
+    """
+    pdf_file = "./tests/data/multi-image-caption.pdf"
+
+    assert pdf.count_pdf_pages(pdf_file) == len(
+        list(high_level.extract_pages(pdf_file)))
+
+
+def test_extract_layout_pages_shared_document():
+    """
+    Test extract_layout_pages gives the same pages for a path and for an
+    already parsed PDF file, which can be reused
+    """
+    pdf_file = "./tests/data/multi-image-caption.pdf"
+
+    expected = [pdf.sort_layout_elements(page)["page_number"]
+                for page in high_level.extract_pages(pdf_file)]
+
+    with open(pdf_file, 'rb') as fp:
+        document = pdf.PDFDocument(pdf.PDFParser(fp))
+        pages = [pdf.sort_layout_elements(page)["page_number"]
+                 for page in pdf.extract_layout_pages(document)]
+        assert pdf.count_pdf_pages(document) == len(expected)
+
+    assert pages == expected
+    assert len(list(pdf.extract_layout_pages(pdf_file,
+                                             page_numbers=[0]))) == 1
+
+
+@pytest.mark.parametrize("colors, filter_types", [(1, 5), (3, 2)])
+def test_decode_png_predictor_stream(colors, filter_types):
+    """
+    Test image streams with PNG predictors are decoded to the same data
+    as pdfminer.six does
+    """
+    import zlib
+    from pdfminer.psparser import LIT
+    from pdfminer.pdftypes import PDFStream
+
+    columns, rows = 7, 6
+    # pdfminer only reverses all filter types for grayscale images
+    scanlines = b"".join(bytes([row % filter_types]) + bytes(
+        (row * 31 + i * 7) % 256 for i in range(columns * colors))
+        for row in range(rows))
+    attrs = {"Filter": LIT("FlateDecode"), "Width": columns, "Height": rows,
+             "DecodeParms": {"Predictor": 15, "Colors": colors,
+                             "Columns": columns}}
+    expected = PDFStream(attrs, zlib.compress(scanlines)).get_data()
+
+    stream = PDFStream(attrs, zlib.compress(scanlines))
+    assert pdf.decode_png_predictor_stream(stream)
+    assert stream.get_data() == expected
+
+    # streams without predictors are left to pdfminer
+    plain = PDFStream({"Filter": LIT("FlateDecode")},
+                      zlib.compress(scanlines))
+    assert not pdf.decode_png_predictor_stream(plain)
+    assert plain.get_data() == scanlines
+
+    # streams without the image height are left to pdfminer
+    no_height = PDFStream({k: v for k, v in attrs.items() if k != "Height"},
+                          zlib.compress(scanlines))
+    assert not pdf.decode_png_predictor_stream(no_height)
+    assert no_height.get_data() == expected
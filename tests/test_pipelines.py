@@ -4,7 +4,10 @@ Pytest will automatically run all functions that start with test_ in this file.
 """
 
 import os
-from visarchpy.pipelines import start_logging, find_pdf_files
+import pytest
+from visarchpy.pipelines import start_logging, find_pdf_files, Layout
+from visarchpy.pipelines import manage_input_files, _batch_pages
+from visarchpy.pipelines import _pdf_file_dirs, _ImageSaver
 from logging import Logger
 
 
@@ -23,9 +26,281 @@ def test_start_logging():
         os.remove(test_log)
 
 
+def test_start_logging_replaces_file_handler(tmp_path):
+    """Test a logger started again only logs to the new log file"""
+
+    first_log = tmp_path / "00001.log"
+    second_log = tmp_path / "00002.log"
+    start_logging("BatchLogger", str(first_log), "00001")
+    logger = start_logging("BatchLogger", str(second_log), "00002")
+    logger.info("Processing file: %s", "00002.pdf")
+
+    assert len(logger.handlers) == 1
+    assert "00002.pdf" not in first_log.read_text()
+    assert "Starting BatchLogger pipeline for entry: 00002" in \
+        second_log.read_text()
+    assert "Processing file: 00002.pdf" in second_log.read_text()
+
+    logger.handlers[0].close()
+
+
 def test_find_pdf_files():
     """Test find_pdf_files function"""
 
     pdf_files = find_pdf_files("tests/data")
     assert isinstance(pdf_files, list)
     assert len(pdf_files) == 1
+
+
+def test_find_pdf_files_cache(tmp_path):
+    """Test find_pdf_files sees files added after a directory was scanned"""
+
+    (tmp_path / "00001_a.pdf").touch()
+    (tmp_path / "00002_a.pdf").touch()
+    (tmp_path / "00001_notes.txt").touch()
+
+    assert find_pdf_files(str(tmp_path), prefix="00001") == [
+        str(tmp_path / "00001_a.pdf")]
+
+    (tmp_path / "00001_b.pdf").touch()
+    # make the change visible on file systems with coarse timestamps
+    os.utime(tmp_path, ns=(0, os.stat(tmp_path).st_mtime_ns + 1))
+
+    assert sorted(find_pdf_files(str(tmp_path), prefix="00001")) == [
+        str(tmp_path / "00001_a.pdf"), str(tmp_path / "00001_b.pdf")]
+
+    # the cache can be cleared when the directory doesn't look changed
+    mtime_ns = os.stat(tmp_path).st_mtime_ns
+    (tmp_path / "00001_c.pdf").touch()
+    os.utime(tmp_path, ns=(0, mtime_ns))
+    find_pdf_files.cache_clear()
+
+    assert len(find_pdf_files(str(tmp_path), prefix="00001")) == 3
+
+
+def test_max_workers():
+    """Test max_workers must be a positive number or None"""
+
+    pipeline = Layout("tests/data/", "tests/data/", max_workers=None)
+    assert pipeline.max_workers is None
+
+    with pytest.raises(ValueError):
+        Layout("tests/data/", "tests/data/", max_workers=0)
+
+
+def test_find_pdf_files_paths(tmp_path):
+    """Test find_pdf_files returns existing paths with and without
+    a trailing slash, and only files that match the prefix"""
+
+    for name in ["00001_a.pdf", "00001_b.pdf", "00002_a.pdf", "00001.txt"]:
+        (tmp_path / name).touch()
+    (tmp_path / "00001_dir.pdf").mkdir()
+
+    for directory in [str(tmp_path), str(tmp_path) + "/"]:
+        pdf_files = find_pdf_files(directory, prefix="00001")
+        assert sorted(os.path.basename(f) for f in pdf_files) == [
+            "00001_a.pdf", "00001_b.pdf"]
+        assert all(os.path.isfile(f) for f in pdf_files)
+
+
+def test_manage_input_files(tmp_path):
+    """Test PDF and MODS files are copied, and existing files are kept"""
+
+    source = tmp_path / "source"
+    destination = tmp_path / "destination"
+    source.mkdir()
+    destination.mkdir()
+    pdf_files = []
+    for name in ["00001_a.pdf", "00001_b.pdf"]:
+        (source / name).write_text("new")
+        pdf_files.append(str(source / name))
+    mods_file = source / "00001_mods.xml"
+    mods_file.write_text("new")
+    (destination / "00001_b.pdf").write_text("old")
+
+    manage_input_files(pdf_files, str(destination), str(mods_file))
+
+    assert (destination / "00001_a.pdf").read_text() == "new"
+    assert (destination / "00001_b.pdf").read_text() == "old"
+    assert (destination / "00001_mods.xml").read_text() == "new"
+
+
+def test_batch_pages():
+    """Test pages are grouped in batches of consecutive pages"""
+
+    assert _batch_pages([1, 2, 3, 4, 5], 2) == [[1, 2], [3, 4], [5]]
+    assert _batch_pages([1, 2, 4, 7, 8], 4) == [[1, 2], [4], [7, 8]]
+    assert _batch_pages([], 4) == []
+
+
+def test_queued_page_batches():
+    """Test consecutive pages waiting in a queue are grouped in batches"""
+
+    import queue
+    from visarchpy.pipelines import _queued_page_batches
+
+    page_queue = queue.Queue()
+    for page_number in [2, 3, 5, 6, 7]:
+        page_queue.put({"page_number": page_number})
+    page_queue.put(None)
+
+    assert list(_queued_page_batches(1, page_queue, 2)) == [
+        [1, 2], [3], [5, 6], [7]]
+
+
+def test_split_pdf_pages(monkeypatch):
+    """Test large PDF files are split into page ranges of even size, and
+    small PDF files are kept whole"""
+
+    import visarchpy.pipelines as pipelines
+
+    page_counts = {"large.pdf": 9, "small.pdf": 1}
+    monkeypatch.setattr(pipelines, "count_pdf_pages", page_counts.get)
+
+    tasks = pipelines._split_pdf_pages(["large.pdf", "small.pdf"],
+                                       workers=2)
+
+    assert tasks == [("large.pdf", [0, 1]), ("large.pdf", [2, 3]),
+                     ("large.pdf", [4, 5]), ("large.pdf", [6, 7]),
+                     ("large.pdf", [8]), ("small.pdf", None)]
+    assert pipelines._split_pdf_pages(["large.pdf", "small.pdf"],
+                                      workers=1) == [
+        ("large.pdf", [0, 1, 2]), ("large.pdf", [3, 4, 5]),
+        ("large.pdf", [6, 7, 8]), ("small.pdf", None)]
+
+
+def test_extract_visuals_by_layout_cache(tmp_path, monkeypatch):
+    """Test a cached layout is reused instead of analysing the PDF file"""
+
+    import logging
+    import visarchpy.pipelines as pipelines
+    import visarchpy.cli.settings as default_settings
+    from visarchpy.metadata import Metadata
+
+    settings = default_settings.init()
+    logger = logging.getLogger("test-layout-cache")
+
+    def run(page_numbers=None):
+        results = pipelines.extract_visuals_by_layout(
+            "./tests/data/multi-image-caption.pdf", Metadata(),
+            "./tests/data", str(tmp_path), "pdf-001", settings, logger,
+            "00000", page_numbers=page_numbers, use_cache=True)
+        return [(visual.bbox, visual.caption, visual.location.file_path)
+                for visual in results["metadata"].visuals]
+
+    pdf_file_dir = tmp_path / "00000" / "pdf-001"
+    expected = run()
+    assert len(expected) > 0
+    assert os.listdir(pdf_file_dir / pipelines.LAYOUT_CACHE_DIR) == [
+        "page-1.pkl"]
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("layout was analysed again")
+
+    monkeypatch.setattr(pipelines, "extract_layout_pages", fail)
+    assert run() == expected
+    # pages are cached one by one, so a page range of the PDF file is read
+    # from the cache too, and no image is saved again
+    images = sorted(os.listdir(pdf_file_dir))
+    assert run(page_numbers=[0]) == expected
+    assert sorted(os.listdir(pdf_file_dir)) == images
+
+
+def test_extract_visuals_by_layout_read_error(tmp_path, monkeypatch):
+    """Test pages read before pdfminer fails are processed, and the layout
+    of a PDF file that failed isn't cached"""
+
+    import logging
+    import visarchpy.pipelines as pipelines
+    import visarchpy.cli.settings as default_settings
+    from visarchpy.metadata import Metadata
+    from pdfminer.pdfparser import PDFSyntaxError
+
+    extract_layout_pages = pipelines.extract_layout_pages
+
+    def failing_pages(*args, **kwargs):
+        yield from extract_layout_pages(*args, **kwargs)
+        raise PDFSyntaxError("truncated file")
+
+    monkeypatch.setattr(pipelines, "extract_layout_pages", failing_pages)
+
+    results = pipelines.extract_visuals_by_layout(
+        "./tests/data/multi-image-caption.pdf", Metadata(),
+        "./tests/data", str(tmp_path), "pdf-001",
+        default_settings.init(), logging.getLogger("test-layout-error"),
+        "00000", use_cache=True)
+
+    assert len(results["metadata"].visuals) > 0
+    assert not (tmp_path / "00000" / "pdf-001"
+                / pipelines.LAYOUT_CACHE_DIR).exists()
+
+
+def test_layout_failed_tasks(tmp_path, monkeypatch):
+    """Test a task that fails in pdfminer is skipped by the parallel Layout
+    pipeline, and other errors stop the run"""
+
+    from concurrent.futures import ThreadPoolExecutor
+    from concurrent.futures.process import BrokenProcessPool
+    import visarchpy.pipelines as pipelines
+    import visarchpy.cli.settings as default_settings
+    from pdfminer.pdfparser import PDFSyntaxError
+
+    pdf = "tests/data/multi-image-caption.pdf"
+    monkeypatch.setattr(pipelines, "_process_pool", ThreadPoolExecutor)
+    monkeypatch.setattr(pipelines, "_split_pdf_pages",
+                        lambda pdf_files, workers: [(pdf, [0]), (pdf, [1])])
+    worker = pipelines._extract_visuals_by_layout_worker
+
+    def run(error):
+        def failing_worker(*args):
+            if args[-2] == [1]:  # page_numbers of the second task
+                raise error
+            return worker(*args)
+
+        monkeypatch.setattr(pipelines, "_extract_visuals_by_layout_worker",
+                            failing_worker)
+        return Layout("tests/data", str(tmp_path),
+                      settings=default_settings.init(), ignore_id=True,
+                      max_workers=2).run()
+
+    results = run(PDFSyntaxError("truncated file"))
+    assert results["metadata"].total_visuals > 0
+
+    with pytest.raises(BrokenProcessPool):
+        run(BrokenProcessPool("a worker died"))
+
+
+def test_pdf_file_dirs():
+    """Test PDF files get one numbered directory each, in order"""
+
+    pdf_files = ["data/b.pdf", "data/a.pdf", "data/c.pdf"]
+
+    assert _pdf_file_dirs(pdf_files) == {"data/b.pdf": "pdf-001",
+                                         "data/a.pdf": "pdf-002",
+                                         "data/c.pdf": "pdf-003"}
+    assert _pdf_file_dirs([]) == {}
+
+
+def test_image_saver(monkeypatch):
+    """Test images are saved in a thread, and errors are raised on exit"""
+    import threading
+    from visarchpy import ocr
+
+    saved = []
+
+    def crop_images_to_bbox(ocr_results, image_directory):
+        if image_directory == "failing":
+            raise OSError("disk full")
+        saved.append((ocr_results, image_directory,
+                      threading.current_thread()))
+
+    monkeypatch.setattr(ocr, "crop_images_to_bbox", crop_images_to_bbox)
+
+    with _ImageSaver() as image_saver:
+        image_saver.save({"page-1": {}}, "images")
+    assert saved[0][:2] == ({"page-1": {}}, "images")
+    assert saved[0][2] is not threading.current_thread()
+
+    with pytest.raises(OSError):
+        with _ImageSaver() as image_saver:
+            image_saver.save({}, "failing")